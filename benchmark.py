@@ -0,0 +1,416 @@
+"""
+Offline benchmark for conversion and chunking throughput
+
+Runs the FastAPI app in-process (no network, no deployment) against a
+generated corpus of PDF, DOCX and HTML documents of several sizes, and
+measures for /convert/file, /convert/url and /chunk at each concurrency level:
+latency percentiles, throughput, per-stage time (from metadata.timings) and
+peak RSS. Results are written as JSON so runs can be compared:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+
+The corpus is generated deterministically (fixed seed), so two runs on the
+same machine measure the same documents. Caches and the coalescing of
+identical concurrent conversions are disabled unless --cache is given, so
+every request pays for a full conversion.
+"""
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+import argparse
+import asyncio
+import functools
+import platform
+import resource
+import datetime
+import subprocess
+import statistics
+import threading
+import random
+import time
+import json
+import os
+
+SIZES = {"small": 1, "medium": 10, "large": 50}
+FORMATS = ("pdf", "docx", "html")
+ENDPOINTS = ("convert_file", "convert_url", "chunk")
+DEFAULT_CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark-corpus")
+
+WORDS = (
+    "document conversion layout table figure section paragraph model page text "
+    "chunk token retrieval vector search index embedding pipeline service request "
+    "result metadata heading summary analysis report revenue quarter customer data"
+).split()
+
+
+# -- Corpus -----------------------------------------------------------------
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 16))]
+    return " ".join(words).capitalize() + "."
+
+
+def _page_content(rng: random.Random, page: int) -> dict:
+    """Title, paragraphs and a small table for one page"""
+    return {
+        "heading": f"Section {page}: {rng.choice(WORDS).title()} {rng.choice(WORDS)}",
+        "paragraphs": [" ".join(_sentence(rng) for _ in range(4)) for _ in range(3)],
+        "table": [["Item", "Quarter", "Value"]] + [
+            [rng.choice(WORDS).title(), f"Q{rng.randint(1, 4)}", str(rng.randint(100, 9999))]
+            for _ in range(4)
+        ],
+    }
+
+
+def _wrap(text: str, width: int = 90) -> List[str]:
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    if line:
+        lines.append(line)
+    return lines
+
+
+def write_pdf(path: str, pages: List[dict]):
+    """Write a born-digital PDF (Helvetica text, ruled table) without extra dependencies"""
+    def escape(text):
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >>"]
+    page_ids = []
+    for content in pages:
+        ops = [f"BT /F2 14 Tf 60 750 Td ({escape(content['heading'])}) Tj ET"]
+        y = 720
+        for paragraph in content["paragraphs"]:
+            for line in _wrap(paragraph):
+                ops.append(f"BT /F1 10 Tf 60 {y} Td ({escape(line)}) Tj ET")
+                y -= 13
+            y -= 10
+        y -= 10
+        for row_index, row in enumerate(content["table"]):
+            font = "F2" if row_index == 0 else "F1"
+            for col, cell in enumerate(row):
+                ops.append(f"BT /{font} 10 Tf {66 + col * 150} {y} Td ({escape(cell)}) Tj ET")
+            ops.append(f"0.5 w 60 {y - 5} m 510 {y - 5} l S")
+            y -= 18
+        stream = "\n".join(ops)
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def write_docx(path: str, pages: List[dict]):
+    from docx import Document
+
+    document = Document()
+    for content in pages:
+        document.add_heading(content["heading"], level=1)
+        for paragraph in content["paragraphs"]:
+            document.add_paragraph(paragraph)
+        table = document.add_table(rows=len(content["table"]), cols=len(content["table"][0]))
+        for row_index, row in enumerate(content["table"]):
+            for col, cell in enumerate(row):
+                table.cell(row_index, col).text = cell
+        document.add_page_break()
+    document.save(path)
+
+
+def write_html(path: str, pages: List[dict]):
+    parts = ["<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Benchmark</title></head><body>"]
+    for content in pages:
+        parts.append(f"<h1>{content['heading']}</h1>")
+        parts.extend(f"<p>{paragraph}</p>" for paragraph in content["paragraphs"])
+        rows = "".join(
+            "<tr>" + "".join(f"<{'th' if i == 0 else 'td'}>{cell}</{'th' if i == 0 else 'td'}>"
+                             for cell in row) + "</tr>"
+            for i, row in enumerate(content["table"])
+        )
+        parts.append(f"<table>{rows}</table>")
+    parts.append("</body></html>")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(parts))
+
+
+WRITERS = {"pdf": write_pdf, "docx": write_docx, "html": write_html}
+
+
+def generate_corpus(directory: str, sizes: List[str], formats: List[str], seed: int = 42) -> List[dict]:
+    """
+    Generate (or reuse) the benchmark documents
+
+    Returns:
+        One entry per document: {"name", "path", "format", "size", "pages"}
+    """
+    os.makedirs(directory, exist_ok=True)
+    documents = []
+    for size in sizes:
+        rng = random.Random(f"{seed}-{size}")
+        pages = [_page_content(rng, page) for page in range(1, SIZES[size] + 1)]
+        for fmt in formats:
+            name = f"{size}.{fmt}"
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                WRITERS[fmt](path, pages)
+            documents.append({"name": name, "path": path, "format": fmt, "size": size,
+                              "pages": SIZES[size]})
+    return documents
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve_directory(directory: str) -> ThreadingHTTPServer:
+    """Serve the corpus over HTTP on a free local port (for /convert/url and /chunk)"""
+    handler = functools.partial(_QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# -- Measurement ------------------------------------------------------------
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 4)
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS of this process and of its (shard) child processes, in MB"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)
+
+
+async def send(client, endpoint: str, document: dict, base_url: str, output_format: str):
+    """Issue one request; returns (seconds, response JSON or None on HTTP error)"""
+    started = time.perf_counter()
+    if endpoint == "convert_file":
+        with open(document["path"], "rb") as f:
+            data = f.read()
+        response = await client.post(
+            "/convert/file",
+            files={"file": (document["name"], data)},
+            data={"output_format": output_format}
+        )
+    elif endpoint == "convert_url":
+        response = await client.post("/convert/url", json={
+            "url": f"{base_url}/{document['name']}", "output_format": output_format
+        })
+    else:
+        response = await client.post("/chunk", json={"url": f"{base_url}/{document['name']}"})
+    elapsed = time.perf_counter() - started
+    body = response.json() if response.status_code == 200 else None
+    return elapsed, body
+
+
+async def run_scenario(client, endpoint: str, document: dict, concurrency: int, requests: int,
+                       base_url: str, output_format: str) -> dict:
+    """Send ``requests`` requests with ``concurrency`` in flight and summarise them"""
+    latencies, stages, errors = [], {}, 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            elapsed, body = await send(client, endpoint, document, base_url, output_format)
+            if not body or not body.get("success"):
+                errors += 1
+                continue
+            latencies.append(elapsed)
+            for stage, seconds in ((body.get("metadata") or {}).get("timings") or {}).items():
+                if isinstance(seconds, (int, float)):
+                    stages.setdefault(stage, []).append(seconds)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    return {
+        "endpoint": endpoint,
+        "document": document["name"],
+        "format": document["format"],
+        "size": document["size"],
+        "pages": document["pages"],
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "latency": {
+            "mean": round(statistics.mean(latencies), 4) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": round(max(latencies), 4) if latencies else None,
+        },
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else None,
+        "pages_per_second": round(len(latencies) * document["pages"] / wall, 3) if wall else None,
+        "stages": {stage: round(statistics.mean(values), 4) for stage, values in stages.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def environment() -> dict:
+    """Details needed to tell whether two result files are comparable"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    from cache import _docling_version
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "docling": _docling_version(),
+        "settings": {key: value for key, value in sorted(os.environ.items()) if key.startswith("DOCLING_")},
+    }
+
+
+async def run(args) -> dict:
+    import httpx
+    import main as service
+    from warmup import warm_up
+
+    documents = generate_corpus(args.corpus, args.sizes, args.formats)
+    server = serve_directory(args.corpus)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    results = []
+    try:
+        async with service.lifespan(service.app):
+            # Let the startup warm-up finish so it is not measured
+            while not warm_up.ready:
+                await asyncio.sleep(0.1)
+            transport = httpx.ASGITransport(app=service.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                         timeout=None) as client:
+                for document in documents:
+                    for endpoint in args.endpoints:
+                        # One untimed request loads whatever the warm-up did not
+                        await send(client, endpoint, document, base_url, args.output_format)
+                        for concurrency in args.concurrency:
+                            result = await run_scenario(
+                                client, endpoint, document, concurrency,
+                                max(args.requests, concurrency), base_url, args.output_format
+                            )
+                            results.append(result)
+                            print(
+                                f"{endpoint:<13} {document['name']:<12} c={concurrency:<3} "
+                                f"p50={result['latency']['p50']}s p95={result['latency']['p95']}s "
+                                f"{result['throughput_rps']} req/s errors={result['errors']}"
+                            )
+    finally:
+        server.shutdown()
+
+    return {"environment": environment(), "peak_rss_mb": peak_rss_mb(), "results": results}
+
+
+def compare(current: dict, previous: dict):
+    """Print p50 latency and throughput changes against an earlier result file"""
+    def key(result):
+        return result["endpoint"], result["document"], result["concurrency"]
+
+    before = {key(result): result for result in previous["results"]}
+    print(f"\nCompared with {previous['environment'].get('commit')} "
+          f"({previous['environment'].get('timestamp')}):")
+    for result in current["results"]:
+        old = before.get(key(result))
+        if not old or not old["latency"]["p50"] or not result["latency"]["p50"]:
+            continue
+        latency_change = (result["latency"]["p50"] / old["latency"]["p50"] - 1) * 100
+        throughput_change = (
+            (result["throughput_rps"] / old["throughput_rps"] - 1) * 100
+            if old["throughput_rps"] else 0
+        )
+        print(f"{result['endpoint']:<13} {result['document']:<12} c={result['concurrency']:<3} "
+              f"p50 {latency_change:+.1f}%  throughput {throughput_change:+.1f}%")
+    print(f"peak RSS {previous['peak_rss_mb']} MB -> {current['peak_rss_mb']} MB")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=lambda v: v.split(","), default=list(SIZES),
+                        help=f"Comma-separated document sizes ({', '.join(SIZES)})")
+    parser.add_argument("--formats", type=lambda v: v.split(","), default=list(FORMATS),
+                        help=f"Comma-separated formats ({', '.join(FORMATS)})")
+    parser.add_argument("--endpoints", type=lambda v: v.split(","), default=list(ENDPOINTS),
+                        help=f"Comma-separated endpoints ({', '.join(ENDPOINTS)})")
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",")],
+                        default=[1, 2, 4], help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=5, help="Requests per scenario")
+    parser.add_argument("--output-format", default="markdown", help="Format for /convert/*")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_DIR, help="Corpus directory")
+    parser.add_argument("--output", default="benchmark-results.json", help="Result file")
+    parser.add_argument("--compare", help="Earlier result file to compare with")
+    parser.add_argument("--cache", action="store_true",
+                        help="Keep the conversion and download caches and request coalescing enabled")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    for name in args.sizes:
+        if name not in SIZES:
+            raise SystemExit(f"Unknown size: {name}")
+    for name in args.formats:
+        if name not in WRITERS:
+            raise SystemExit(f"Unknown format: {name}")
+    for name in args.endpoints:
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint: {name}")
+
+    # Read by the service modules at import time, so set before importing main
+    if not args.cache:
+        os.environ.setdefault("DOCLING_CACHE_ENABLED", "false")
+        os.environ.setdefault("DOCLING_DOWNLOAD_CACHE_MB", "0")
+        os.environ.setdefault("DOCLING_COALESCE", "false")
+    os.environ.setdefault("DOCLING_JOB_STORE", "memory")
+    os.environ.setdefault("DOCLING_MAX_QUEUE", str(max(args.concurrency) * 4))
+
+    report = asyncio.run(run(args))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output} (peak RSS {report['peak_rss_mb']} MB)")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
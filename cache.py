@@ -0,0 +1,192 @@
+"""
+Content-addressed cache of converted DoclingDocuments
+
+Documents are keyed by the SHA-256 of their source bytes plus the converter
+options, so the same file fetched from a different URL (or re-chunked with
+different chunking settings) reuses one conversion. Two tiers are kept: a
+small in-memory LRU of live documents and an on-disk store of JSON exports
+bounded by total size.
+"""
+from collections import OrderedDict
+from importlib import metadata as importlib_metadata
+from typing import TYPE_CHECKING, Optional, Tuple
+import hashlib
+import tempfile
+import threading
+import logging
+import json
+import os
+
+if TYPE_CHECKING:
+    from docling_core.types.doc import DoclingDocument
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENABLED = os.environ.get("DOCLING_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+CACHE_DIR = os.environ.get("DOCLING_CACHE_DIR", os.path.join(tempfile.gettempdir(), "docling-cache"))
+CACHE_MEMORY_ITEMS = int(os.environ.get("DOCLING_CACHE_MEMORY_ITEMS", 16))
+CACHE_DISK_MB = int(os.environ.get("DOCLING_CACHE_DISK_MB", 1024))
+
+
+def _docling_version() -> str:
+    try:
+        return importlib_metadata.version("docling")
+    except importlib_metadata.PackageNotFoundError:
+        return "unknown"
+
+
+class ConversionCache:
+    """Two-tier (memory LRU + size-bounded disk) DoclingDocument cache"""
+
+    def __init__(self, directory: str, memory_items: int, disk_bytes: int, enabled: bool = True):
+        self.directory = directory
+        self.memory_items = memory_items
+        self.disk_bytes = disk_bytes
+        self.enabled = enabled
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = _docling_version()
+        self.hits = 0
+        self.misses = 0
+        if enabled and disk_bytes > 0:
+            os.makedirs(directory, exist_ok=True)
+
+    def make_key(self, content_hash: str, **options) -> str:
+        """
+        Build a cache key from the source hash and the options that affect conversion
+
+        Args:
+            content_hash: SHA-256 hex digest of the source bytes
+            **options: Converter options (only JSON-serialisable values)
+
+        Returns:
+            Hex digest identifying the conversion
+        """
+        payload = json.dumps(
+            {"sha256": content_hash, "docling": self._version, "options": options},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Tuple[Optional["DoclingDocument"], Optional[str]]:
+        """
+        Look a document up, memory tier first
+
+        Returns:
+            Tuple of (document or None, tier name "memory"/"disk" or None)
+        """
+        if not self.enabled:
+            return None, None
+
+        with self._lock:
+            doc = self._memory.get(key)
+            if doc is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return doc, "memory"
+
+        doc = self._read_disk(key)
+        with self._lock:
+            if doc is None:
+                self.misses += 1
+                return None, None
+            self.hits += 1
+            self._remember(key, doc)
+        return doc, "disk"
+
+    def put(self, key: str, doc: "DoclingDocument"):
+        """Store a freshly converted document in both tiers"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._remember(key, doc)
+        self._write_disk(key, doc)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_items": len(self._memory)
+            }
+
+    def _remember(self, key: str, doc: "DoclingDocument"):
+        # Caller holds self._lock
+        if self.memory_items <= 0:
+            return
+        self._memory[key] = doc
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional["DoclingDocument"]:
+        if self.disk_bytes <= 0:
+            return None
+        from docling_core.types.doc import DoclingDocument
+
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                doc = DoclingDocument.model_validate(json.load(f))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry {key}: {str(e)}")
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+        # Touch the entry so eviction treats it as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return doc
+
+    def _write_disk(self, key: str, doc: "DoclingDocument"):
+        if self.disk_bytes <= 0:
+            return
+        path = self._disk_path(key)
+        try:
+            with tempfile.NamedTemporaryFile(
+                "w", encoding="utf-8", dir=self.directory, suffix=".tmp", delete=False
+            ) as f:
+                json.dump(doc.export_to_dict(), f)
+                temp_path = f.name
+            os.replace(temp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to write cache entry {key}: {str(e)}")
+            return
+        self._evict()
+
+    def _evict(self):
+        """Delete least recently used entries until the disk tier fits its budget"""
+        try:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            if total <= self.disk_bytes:
+                return
+            for _, size, path in sorted(entries):
+                os.unlink(path)
+                total -= size
+                if total <= self.disk_bytes:
+                    break
+        except OSError as e:
+            logger.warning(f"Cache eviction failed: {str(e)}")
+
+
+conversion_cache = ConversionCache(
+    directory=CACHE_DIR,
+    memory_items=CACHE_MEMORY_ITEMS,
+    disk_bytes=CACHE_DISK_MB * 1024 * 1024,
+    enabled=CACHE_ENABLED
+)
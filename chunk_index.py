@@ -0,0 +1,189 @@
+"""
+Per-file_id record of the chunks last returned, for incremental re-chunking
+
+Every chunk gets a ``chunk_id`` derived from its file_id and content, so an
+unchanged passage keeps its id when the document around it is revised. With
+``diff: true`` the ids of a /chunk run are compared with the last ids the
+caller acknowledged for the same file_id; the caller then only embeds the
+added chunks and deletes the removed ones.
+
+A diff run does not replace the acknowledged ids: it stores its ids as a
+pending revision, returned with the diff. Once the caller has applied the
+diff it acknowledges the revision, which makes it the new base. A response
+lost on the way (timeout, retry) therefore changes nothing: the retry is
+diffed against the same base and reports the same chunks as added.
+
+The ids are kept in SQLite (like the job store) so several gunicorn workers
+see the same state; point DOCLING_CHUNK_INDEX_DB at a persistent volume to
+keep it across deploys.
+"""
+from typing import Dict, List, Optional
+import tempfile
+import hashlib
+import threading
+import sqlite3
+import json
+import time
+import os
+
+CHUNK_INDEX_DB = os.environ.get(
+    "DOCLING_CHUNK_INDEX_DB", os.path.join(tempfile.gettempdir(), "docling-chunk-index.sqlite3")
+)
+
+
+def revision_of(chunk_ids: List[str]) -> str:
+    """Revision token of a set of chunk ids (the same ids give the same token)"""
+    return hashlib.sha256("\n".join(chunk_ids).encode("utf-8")).hexdigest()[:16]
+
+
+def diff_chunk_ids(previous: Optional[List[str]], current: List[str]) -> Dict[str, List[str]]:
+    """
+    Compare the chunk ids of two runs over the same file_id
+
+    Args:
+        previous: Ids stored by the previous run (None if there was none)
+        current: Ids of this run, in document order
+
+    Returns:
+        {"added": [...], "unchanged": [...], "removed": [...]}; added and
+        unchanged follow the current order, removed the previous one
+    """
+    before = set(previous or [])
+    after = set(current)
+    return {
+        "added": [chunk_id for chunk_id in current if chunk_id not in before],
+        "unchanged": [chunk_id for chunk_id in current if chunk_id in before],
+        "removed": [chunk_id for chunk_id in previous or [] if chunk_id not in after]
+    }
+
+
+class ChunkIndex:
+    """SQLite table of the acknowledged and pending chunk ids per file_id"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        # Caller holds self._lock. Opened on first use in each process, so a
+        # connection is never inherited across a fork
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._pid = os.getpid()
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            with self._conn:
+                # Other workers may open the index at the same time
+                self._conn.execute("BEGIN IMMEDIATE")
+                columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunk_index)")}
+                migrate = bool(columns) and "revision" not in columns
+                if migrate:
+                    # Table from before revisions: its ids count as acknowledged
+                    self._conn.execute("ALTER TABLE chunk_index RENAME TO chunk_index_v1")
+                # chunk_ids is NULL until the first revision is acknowledged
+                self._conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS chunk_index (
+                        file_id TEXT PRIMARY KEY,
+                        chunk_ids TEXT,
+                        updated_at REAL NOT NULL,
+                        revision TEXT,
+                        pending_ids TEXT,
+                        pending_revision TEXT
+                    )
+                    """
+                )
+                if migrate:
+                    self._conn.execute(
+                        "INSERT INTO chunk_index (file_id, chunk_ids, updated_at) "
+                        "SELECT file_id, chunk_ids, updated_at FROM chunk_index_v1"
+                    )
+                    self._conn.execute("DROP TABLE chunk_index_v1")
+        return self._conn
+
+    def get(self, file_id: str) -> Optional[List[str]]:
+        """Acknowledged chunk ids of a file_id, or None if none were acknowledged"""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT chunk_ids FROM chunk_index WHERE file_id = ?", (file_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def update(self, file_id: str, chunk_ids: List[str]) -> dict:
+        """
+        Diff a run's chunk ids with the acknowledged ones and keep them as pending
+
+        Args:
+            file_id: Caller's document identifier
+            chunk_ids: Ids of every chunk of the new run, in document order
+
+        Returns:
+            The diff_chunk_ids() result plus the "revision" to acknowledge
+        """
+        revision = revision_of(chunk_ids)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                # Hold the write lock from the read on: other workers may diff the same file_id
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT chunk_ids FROM chunk_index WHERE file_id = ?", (file_id,)
+                ).fetchone()
+                if row is None:
+                    conn.execute(
+                        "INSERT INTO chunk_index (file_id, chunk_ids, updated_at, pending_ids, pending_revision) "
+                        "VALUES (?, NULL, ?, ?, ?)",
+                        (file_id, time.time(), json.dumps(chunk_ids), revision)
+                    )
+                else:
+                    conn.execute(
+                        "UPDATE chunk_index SET pending_ids = ?, pending_revision = ?, updated_at = ? "
+                        "WHERE file_id = ?",
+                        (json.dumps(chunk_ids), revision, time.time(), file_id)
+                    )
+        acknowledged = json.loads(row[0]) if row and row[0] is not None else None
+        return {**diff_chunk_ids(acknowledged, chunk_ids), "revision": revision}
+
+    def acknowledge(self, file_id: str, revision: str) -> Optional[bool]:
+        """
+        Make a pending revision the base of the next diffs
+
+        Returns:
+            True if acknowledged (also when it already was), False if the
+            revision is neither pending nor acknowledged, None for an
+            unknown file_id
+        """
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT revision, pending_ids, pending_revision FROM chunk_index WHERE file_id = ?",
+                    (file_id,)
+                ).fetchone()
+                if row is None:
+                    return None
+                acknowledged, pending_ids, pending_revision = row
+                if revision == pending_revision:
+                    conn.execute(
+                        "UPDATE chunk_index SET chunk_ids = ?, revision = ?, pending_ids = NULL, "
+                        "pending_revision = NULL, updated_at = ? WHERE file_id = ?",
+                        (pending_ids, revision, time.time(), file_id)
+                    )
+                    return True
+        return revision == acknowledged
+
+    def forget(self, file_id: str) -> bool:
+        """Drop the stored ids of a file_id; False if there were none"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute("DELETE FROM chunk_index WHERE file_id = ?", (file_id,))
+        return cursor.rowcount == 1
+
+
+chunk_index = ChunkIndex(CHUNK_INDEX_DB)
@@ -0,0 +1,152 @@
+"""
+Shared tokenizers and HybridChunker instances
+
+Tokenizers are configured by name, loaded once per process and shared by all
+worker threads; HybridChunkers are built once per (tokenizer, max_tokens,
+merge_peers) configuration and kept in a small LRU (the configured presets
+are never evicted), since max_tokens comes from the request. Sharing is safe
+because every caller, embeddings included, uses the tokenizers with the same
+(no truncation, no padding) settings, so the fast tokenizer's internal state
+is never reconfigured concurrently.
+
+transformers and the Docling chunker are imported on first use, not when
+the module is loaded.
+"""
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import threading
+import logging
+import os
+
+if TYPE_CHECKING:
+    from docling.chunking import HybridChunker
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_tokenizers(value: str) -> Dict[str, str]:
+    """Parse "name=model_id,..." (a bare model id is its own name)"""
+    tokenizers = {}
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, model_id = entry.partition("=")
+        tokenizers[name.strip()] = (model_id or name).strip()
+    return tokenizers
+
+
+def _parse_presets(value: str) -> List[Tuple[Optional[str], int, bool]]:
+    """Parse "tokenizer:max_tokens:merge_peers,..." (tokenizer may be empty for the default)"""
+    presets = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        parts = entry.split(":")
+        name = parts[0] or None
+        max_tokens = int(parts[1]) if len(parts) > 1 and parts[1] else 512
+        merge_peers = parts[2].lower() not in ("0", "false", "no") if len(parts) > 2 else True
+        presets.append((name, max_tokens, merge_peers))
+    return presets
+
+
+TOKENIZERS = _parse_tokenizers(
+    os.environ.get("DOCLING_TOKENIZERS", "minilm=sentence-transformers/all-MiniLM-L6-v2")
+)
+DEFAULT_TOKENIZER = os.environ.get("DOCLING_DEFAULT_TOKENIZER", next(iter(TOKENIZERS)))
+CHUNKER_PRESETS = _parse_presets(os.environ.get("DOCLING_CHUNKER_PRESETS", ":512:true"))
+# HybridChunkers kept for non-preset configurations
+CHUNKER_CACHE_SIZE = int(os.environ.get("DOCLING_CHUNKER_CACHE_SIZE", 16))
+
+
+class UnknownTokenizerError(ValueError):
+    """Raised for a tokenizer name that is not configured"""
+
+
+class ChunkerRegistry:
+    """Process-wide cache of tokenizers and HybridChunkers"""
+
+    def __init__(self, tokenizers: Dict[str, str], default_tokenizer: str,
+                 presets: List[Tuple[Optional[str], int, bool]] = CHUNKER_PRESETS,
+                 cache_size: int = CHUNKER_CACHE_SIZE):
+        if default_tokenizer not in tokenizers:
+            raise ValueError(f"Default tokenizer {default_tokenizer} is not configured")
+        self.tokenizers = tokenizers
+        self.default_tokenizer = default_tokenizer
+        self.presets = presets
+        self.cache_size = cache_size
+        self._preset_keys = {
+            (name or default_tokenizer, max_tokens, merge_peers) for name, max_tokens, merge_peers in presets
+        }
+        self._loaded: Dict[str, object] = {}
+        self._presets: Dict[Tuple[str, int, bool], "HybridChunker"] = {}
+        self._chunkers: "OrderedDict[Tuple[str, int, bool], HybridChunker]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, name: Optional[str]) -> str:
+        """Map an optional tokenizer name to a configured one"""
+        name = name or self.default_tokenizer
+        if name not in self.tokenizers:
+            raise UnknownTokenizerError(
+                f"Unknown tokenizer: {name} (available: {', '.join(self.tokenizers)})"
+            )
+        return name
+
+    def get_tokenizer(self, name: Optional[str] = None):
+        """Get a loaded Hugging Face tokenizer by configured name"""
+        name = self.resolve(name)
+        tokenizer = self._loaded.get(name)
+        if tokenizer is None:
+            with self._lock:
+                tokenizer = self._loaded.get(name)
+                if tokenizer is None:
+                    from transformers import AutoTokenizer
+
+                    model_id = self.tokenizers[name]
+                    logger.info(f"Loading tokenizer: {model_id}")
+                    tokenizer = AutoTokenizer.from_pretrained(model_id)
+                    self._loaded[name] = tokenizer
+        return tokenizer
+
+    def _build_chunker(self, key: Tuple[str, int, bool]) -> "HybridChunker":
+        from docling.chunking import HybridChunker
+        from docling_core.transforms.chunker.tokenizer.huggingface import HuggingFaceTokenizer
+
+        name, max_tokens, merge_peers = key
+        return HybridChunker(
+            tokenizer=HuggingFaceTokenizer(tokenizer=self.get_tokenizer(name), max_tokens=max_tokens),
+            merge_peers=merge_peers
+        )
+
+    def get_chunker(self, name: Optional[str], max_tokens: int, merge_peers: bool) -> "HybridChunker":
+        """Get the shared HybridChunker for a configuration, building it on first use"""
+        key = (self.resolve(name), max_tokens, merge_peers)
+        chunker = self._presets.get(key)
+        if chunker is not None:
+            return chunker
+        with self._lock:
+            chunker = self._chunkers.get(key)
+            if chunker is not None:
+                self._chunkers.move_to_end(key)
+                return chunker
+        # Built outside the lock; two threads may build the same one, the last wins
+        chunker = self._build_chunker(key)
+        with self._lock:
+            if key in self._preset_keys:
+                self._presets[key] = chunker
+                return chunker
+            self._chunkers[key] = chunker
+            self._chunkers.move_to_end(key)
+            while len(self._chunkers) > max(0, self.cache_size):
+                self._chunkers.popitem(last=False)
+        return chunker
+
+    def warm_up(self):
+        """Load tokenizers and build the chunkers of the configured presets (never evicted)"""
+        for name, max_tokens, merge_peers in self.presets:
+            self.get_chunker(name, max_tokens, merge_peers)
+        logger.info(f"Chunkers ready: {len(self._presets)} preset configuration(s)")
+
+
+registry = ChunkerRegistry(TOKENIZERS, DEFAULT_TOKENIZER)
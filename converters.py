@@ -0,0 +1,125 @@
+"""
+Named DocumentConverter profiles
+
+Every profile is a set of PDF pipeline options backed by its own
+DocumentConverter, built once per process and shared by all worker threads.
+``fast`` skips OCR and uses the fast TableFormer mode, which is enough for
+born-digital PDFs; ``full`` runs OCR and accurate table structure (Docling's
+defaults). The ``auto`` pseudo-profile is resolved per document: PDFs with a
+text layer use ``fast``, scanned ones ``full``.
+
+Markdown, plain text and HTML never reach these profiles: they are routed to
+the ``light`` converter, which only enables Docling's declarative backends
+and so never loads a model.
+
+Docling itself is only imported when the first converter is built, so
+importing this module (and the app) stays fast.
+"""
+from typing import TYPE_CHECKING, Dict, Optional
+import threading
+import logging
+import os
+
+if TYPE_CHECKING:
+    from docling.document_converter import DocumentConverter
+
+logger = logging.getLogger(__name__)
+
+AUTO = "auto"
+LIGHT = "light"
+
+PROFILES = {
+    # table_mode is a docling TableFormerMode value
+    "fast": {"do_ocr": False, "do_table_structure": True, "table_mode": "fast"},
+    "full": {"do_ocr": True, "do_table_structure": True, "table_mode": "accurate"},
+}
+
+DEFAULT_PROFILE = os.environ.get("DOCLING_DEFAULT_PROFILE", AUTO)
+# Profile used by "auto" for PDFs with / without a text layer
+AUTO_TEXT_PROFILE = os.environ.get("DOCLING_AUTO_TEXT_PROFILE", "fast")
+AUTO_SCANNED_PROFILE = os.environ.get("DOCLING_AUTO_SCANNED_PROFILE", "full")
+# Instances that only serve Markdown, text and HTML: no model is ever loaded
+# and other formats are rejected
+LIGHT_ONLY = os.environ.get("DOCLING_LIGHT_ONLY", "false").lower() in ("1", "true", "yes")
+
+# Profiles converted once by the startup warm-up (see warmup.py)
+WARM_PROFILES = [] if LIGHT_ONLY else [
+    name.strip()
+    for name in os.environ.get("DOCLING_WARM_PROFILES", "fast,full").split(",")
+    if name.strip()
+]
+
+
+class UnknownProfileError(ValueError):
+    """Raised for a pipeline profile name that is not configured"""
+
+
+def build_converter(options: dict) -> "DocumentConverter":
+    """Build a DocumentConverter for one profile's PDF pipeline options"""
+    from docling.datamodel.base_models import InputFormat
+    from docling.datamodel.pipeline_options import PdfPipelineOptions, TableFormerMode
+    from docling.document_converter import DocumentConverter, PdfFormatOption
+
+    pipeline_options = PdfPipelineOptions(
+        do_ocr=options["do_ocr"],
+        do_table_structure=options["do_table_structure"]
+    )
+    pipeline_options.table_structure_options.mode = TableFormerMode(options["table_mode"])
+    return DocumentConverter(
+        format_options={InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)}
+    )
+
+
+def build_light_converter() -> "DocumentConverter":
+    """A converter restricted to formats handled without ML models"""
+    from docling.datamodel.base_models import InputFormat
+    from docling.document_converter import DocumentConverter
+
+    return DocumentConverter(allowed_formats=[InputFormat.MD, InputFormat.HTML])
+
+
+class ConverterRegistry:
+    """Process-wide cache of one DocumentConverter per profile"""
+
+    def __init__(self, profiles: Dict[str, dict], default_profile: str):
+        if default_profile != AUTO and default_profile not in profiles:
+            raise ValueError(f"Default profile {default_profile} is not configured")
+        self.profiles = profiles
+        self.default_profile = default_profile
+        self._converters: Dict[str, "DocumentConverter"] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, name: Optional[str]) -> str:
+        """Map an optional profile name to a configured profile or "auto\""""
+        name = name or self.default_profile
+        if name != AUTO and name not in self.profiles:
+            raise UnknownProfileError(
+                f"Unknown profile: {name} (available: {AUTO}, {', '.join(self.profiles)})"
+            )
+        return name
+
+    def get(self, name: str) -> "DocumentConverter":
+        """Get the shared DocumentConverter of a concrete profile (or LIGHT), building it on first use"""
+        converter = self._converters.get(name)
+        if converter is None:
+            with self._lock:
+                converter = self._converters.get(name)
+                if converter is None:
+                    if name != LIGHT and name not in self.profiles:
+                        raise UnknownProfileError(f"Unknown profile: {name}")
+                    logger.info(f"Building converter for profile: {name}")
+                    if name == LIGHT:
+                        converter = build_light_converter()
+                    else:
+                        converter = build_converter(self.profiles[name])
+                    self._converters[name] = converter
+        return converter
+
+    def load(self, name: str):
+        """Build the converter of a profile and load its PDF pipeline models without converting"""
+        from docling.datamodel.base_models import InputFormat
+
+        self.get(name).initialize_pipeline(InputFormat.PDF)
+
+
+registry = ConverterRegistry(PROFILES, DEFAULT_PROFILE)
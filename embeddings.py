@@ -0,0 +1,153 @@
+"""
+Sentence embeddings computed right after chunking
+
+The embedding model is the Hugging Face model behind the chunking tokenizer
+(``all-MiniLM-L6-v2`` by default), so chunks are sized and embedded with the
+same vocabulary. Vectors are mean-pooled over the last hidden state and L2
+normalised, matching sentence-transformers' output for these models. Texts
+are tokenized once, sorted by length and run in batches of similar length so
+little compute is spent on padding.
+
+Models are loaded once per process on first use and shared by all worker
+threads (inference does not mutate them). torch and transformers are only
+imported then.
+"""
+from typing import TYPE_CHECKING, Dict, List, Optional
+import threading
+import logging
+import base64
+import os
+
+if TYPE_CHECKING:
+    import numpy as np
+    import torch
+
+from chunkers import registry as chunker_registry, ChunkerRegistry
+
+logger = logging.getLogger(__name__)
+
+EMBED_BATCH_SIZE = int(os.environ.get("DOCLING_EMBED_BATCH_SIZE", 32))
+# Longest input in tokens; all-MiniLM-L6-v2 was trained on 256-token inputs
+EMBED_MAX_LENGTH = int(os.environ.get("DOCLING_EMBED_MAX_LENGTH", 256))
+# Load the embedding model of the default tokenizer during the startup warm-up
+EMBED_WARMUP = os.environ.get("DOCLING_EMBED_WARMUP", "false").lower() in ("1", "true", "yes")
+
+EMBEDDING_FORMATS = ("base64", "float")
+
+
+class EmbeddingModels:
+    """Process-wide cache of one embedding model per configured tokenizer"""
+
+    def __init__(self, chunkers: ChunkerRegistry, batch_size: int = EMBED_BATCH_SIZE,
+                 max_length: int = EMBED_MAX_LENGTH):
+        self.chunkers = chunkers
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self._models: Dict[str, "torch.nn.Module"] = {}
+        self._lock = threading.Lock()
+
+    def model_id(self, name: Optional[str] = None) -> str:
+        """Hugging Face id of the model used for a tokenizer name"""
+        return self.chunkers.tokenizers[self.chunkers.resolve(name)]
+
+    def get_model(self, name: Optional[str] = None) -> "torch.nn.Module":
+        """Get the shared embedding model for a tokenizer name, loading it on first use"""
+        name = self.chunkers.resolve(name)
+        model = self._models.get(name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(name)
+                if model is None:
+                    from transformers import AutoModel
+
+                    model_id = self.chunkers.tokenizers[name]
+                    logger.info(f"Loading embedding model: {model_id}")
+                    model = AutoModel.from_pretrained(model_id)
+                    model.eval()
+                    self._models[name] = model
+        return model
+
+    def tokenize(self, texts: List[str], name: Optional[str] = None) -> List[List[int]]:
+        """
+        Token ids of texts, cut to max_length
+
+        The tokenizer is shared with the chunkers, so it is called with the
+        same settings they use (no truncation): passing truncation options
+        would reconfigure the fast tokenizer under concurrent token counts.
+        Long inputs are cut here instead, keeping the closing special token.
+
+        Args:
+            texts: Texts to tokenize
+            name: Configured tokenizer name (None for the default)
+
+        Returns:
+            One list of token ids per text, at most max_length long
+        """
+        tokenizer = self.chunkers.get_tokenizer(name)
+        encoded = tokenizer(
+            texts, return_attention_mask=False, return_token_type_ids=False, verbose=False
+        )["input_ids"]
+        return self.truncate(encoded)
+
+    def truncate(self, input_ids: List[List[int]]) -> List[List[int]]:
+        """Cut token ids (special tokens included) to max_length, keeping the closing special token"""
+        return [ids if len(ids) <= self.max_length else ids[:self.max_length - 1] + ids[-1:]
+                for ids in input_ids]
+
+    def embed(self, texts: List[str], name: Optional[str] = None,
+              input_ids: Optional[List[List[int]]] = None) -> "np.ndarray":
+        """
+        Embed texts with the model of a tokenizer
+
+        Args:
+            texts: Texts to embed
+            name: Configured tokenizer name (None for the default)
+            input_ids: Token ids of the texts from the same tokenizer, when
+                already computed (e.g. to count tokens); not tokenized again
+
+        Returns:
+            float32 array of shape (len(texts), dimensions), rows L2 normalised
+        """
+        import numpy as np
+        import torch
+
+        model = self.get_model(name)
+        tokenizer = self.chunkers.get_tokenizer(name)
+        if not texts:
+            return np.zeros((0, model.config.hidden_size), dtype=np.float32)
+
+        encoded = self.truncate(input_ids) if input_ids is not None else self.tokenize(texts, name)
+        # Length buckets: neighbours in this order pad to almost the same length
+        order = sorted(range(len(texts)), key=lambda i: len(encoded[i]))
+        vectors = np.empty((len(texts), model.config.hidden_size), dtype=np.float32)
+
+        with torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                batch = order[start:start + self.batch_size]
+                inputs = tokenizer.pad({"input_ids": [encoded[i] for i in batch]}, return_tensors="pt")
+                hidden = model(**inputs).last_hidden_state
+                mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+                pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
+                vectors[batch] = pooled.float().numpy()
+        return vectors
+
+    def warm_up(self):
+        """Load the embedding model of the default tokenizer"""
+        self.embed(["warm-up"])
+
+
+def encode_vector(vector: "np.ndarray", embedding_format: str):
+    """
+    Serialise one embedding
+
+    ``base64`` is the little-endian float32 bytes base64-encoded (4 bytes per
+    dimension, decode with ``numpy.frombuffer(base64.b64decode(s), "<f4")``);
+    ``float`` is a plain list of numbers.
+    """
+    if embedding_format == "float":
+        return vector.tolist()
+    return base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+
+
+embedding_models = EmbeddingModels(chunker_registry)
@@ -0,0 +1,94 @@
+"""
+Response encoding negotiated from the Accept and Accept-Encoding headers
+
+Results are serialised with orjson by default, or as MessagePack when the
+client accepts ``application/msgpack``. Bodies of at least
+DOCLING_COMPRESS_MIN_BYTES are compressed with zstd or gzip when the client
+accepts them (zstd preferred). NDJSON lines use the same fast JSON encoder.
+"""
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+import gzip
+import os
+
+import msgpack
+import orjson
+import zstandard
+
+COMPRESS_MIN_BYTES = int(os.environ.get("DOCLING_COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.environ.get("DOCLING_GZIP_LEVEL", 5))
+ZSTD_LEVEL = int(os.environ.get("DOCLING_ZSTD_LEVEL", 3))
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _accepted(header: Optional[str]) -> Dict[str, float]:
+    """Parse an Accept or Accept-Encoding header into {token: q}"""
+    accepted = {}
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[token.strip().lower()] = q
+    return accepted
+
+
+def _plain(payload: Any) -> Any:
+    return payload.model_dump() if isinstance(payload, BaseModel) else payload
+
+
+def dumps(payload: Any) -> bytes:
+    """Serialise a pydantic model or plain value to JSON bytes"""
+    return orjson.dumps(_plain(payload), default=str, option=orjson.OPT_NON_STR_KEYS)
+
+
+def json_line(payload: Any) -> bytes:
+    """One NDJSON line (JSON plus newline)"""
+    return orjson.dumps(
+        _plain(payload), default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+    )
+
+
+def encode_response(request: Request, payload: Any, status_code: int = 200) -> Response:
+    """
+    Serialise a result in the representation the client asked for
+
+    Blocking for large results; endpoints call it through the threadpool.
+
+    Args:
+        request: Incoming request (its Accept and Accept-Encoding headers)
+        payload: Pydantic model or JSON-compatible value
+        status_code: HTTP status of the response
+
+    Returns:
+        Response with JSON or MessagePack body, compressed when worthwhile
+    """
+    accept = _accepted(request.headers.get("accept"))
+    if any(accept.get(media_type, 0) > 0 for media_type in MSGPACK_MEDIA_TYPES):
+        media_type = MSGPACK_MEDIA_TYPES[0]
+        body = msgpack.packb(_plain(payload), use_bin_type=True, default=str)
+    else:
+        media_type = JSON_MEDIA_TYPE
+        body = dumps(payload)
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        encodings = _accepted(request.headers.get("accept-encoding"))
+        if encodings.get("zstd", 0) > 0:
+            body = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+            headers["Content-Encoding"] = "zstd"
+        elif encodings.get("gzip", 0) > 0:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
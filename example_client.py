@@ -114,14 +114,8 @@ def example_2_convert_to_json():
     if result["success"]:
         print(f"✓ Conversion successful!")
         print(f"\nJSON structure preview:")
-        # Parse the content string as JSON if it's a string
-        content = result["content"]
-        if isinstance(content, str):
-            try:
-                content = json.loads(content)
-            except:
-                pass
-        print(json.dumps(content, indent=2)[:500])
+        # The json export is returned as an object
+        print(json.dumps(result["content"], indent=2)[:500])
         print("...")
     else:
         print(f"✗ Conversion failed: {result['error']}")
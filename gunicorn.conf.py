@@ -0,0 +1,113 @@
+"""
+Gunicorn configuration for multi-worker serving
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The app is imported and warmed up once in the master process (preload_app)
+and the workers are forked afterwards, so the Docling models and tokenizers
+are shared copy-on-write instead of being loaded once per worker. The worker
+count comes from WEB_CONCURRENCY, or from the CPU count capped by the memory
+budget per worker (DOCLING_WORKER_MEMORY_MB plus the models of the processes
+it spawns). Workers are replaced after GUNICORN_MAX_REQUESTS requests.
+"""
+import shutil
+import gc
+import os
+
+
+def _memory_limit_mb():
+    """Memory available to the container (cgroup limit, else physical RAM)"""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value) // (1024 * 1024)
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // (1024 * 1024)
+    except (ValueError, OSError):
+        return None
+
+
+def _spawned_models_mb(workers):
+    """
+    Models loaded by the processes one of ``workers`` workers spawns (page
+    shards, process-mode conversion workers), which are not shared
+    """
+    shard_workers = int(os.environ.get("DOCLING_SHARD_WORKERS", min(4, os.cpu_count() or 1)))
+    processes = shard_workers if shard_workers > 1 else 0
+    if os.environ.get("DOCLING_WORKER_MODE", "thread") == "process":
+        processes += int(os.environ.get("DOCLING_MAX_WORKERS", 0)) or max(1, (os.cpu_count() or 1) // workers)
+    return processes * int(os.environ.get("DOCLING_MEMORY_MODEL_MB", 1024))
+
+
+def _default_workers():
+    cpus = os.cpu_count() or 1
+    memory_mb = _memory_limit_mb()
+    if not memory_mb:
+        return cpus
+    # The models are shared; what remains is divided by the per-worker budget
+    spare_mb = memory_mb - int(os.environ.get("DOCLING_SHARED_MEMORY_MB", 1536))
+    budget_mb = int(os.environ.get("DOCLING_WORKER_MEMORY_MB", 1024))
+    for count in range(cpus, 1, -1):
+        if count * (budget_mb + _spawned_models_mb(count)) <= spare_mb:
+            return count
+    return 1
+
+
+workers = int(os.environ.get("WEB_CONCURRENCY", 0)) or _default_workers()
+worker_class = "uvicorn_worker.UvicornWorker"
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+preload_app = True
+
+# Long conversions hold a request open; the worker pool enforces its own limits
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 900))
+graceful_timeout = 30
+keepalive = 600
+
+# Replace each worker after this many requests (0: never), staggered by the
+# jitter so they do not restart together. This releases memory Docling
+# retains between conversions in thread mode too; replacements are forked
+# from the preloaded master, so the shared model pages stay shared.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# Split the CPUs between the processes unless configured explicitly. These are
+# read when the app is imported below, i.e. after this file has been evaluated.
+_cpus_per_worker = max(1, (os.cpu_count() or 1) // workers)
+os.environ.setdefault("DOCLING_MAX_WORKERS", str(_cpus_per_worker))
+os.environ.setdefault("OMP_NUM_THREADS", str(_cpus_per_worker))
+# Tokenizers are used before forking; avoid the Rust thread pool in the children
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+
+def on_starting(server):
+    """Start with an empty Prometheus multiprocess directory (if configured)"""
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that exited"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    """Runs in the master after the app is preloaded, before any worker is forked"""
+    from main import job_manager
+    from warmup import warm_up
+
+    job_manager.recover()
+    # Only load the weights here: the workers run the warm-up inference after
+    # the fork, so the master starts forking quickly and /health answers meanwhile
+    warm_up.preload()
+    # Move the loaded objects out of the collector's generations so garbage
+    # collection in the workers does not write to (and un-share) their pages
+    gc.freeze()
+    server.log.info(f"Models loaded, forking {server.num_workers} workers")
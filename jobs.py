@@ -0,0 +1,463 @@
+"""
+Asynchronous job queue for long conversions, with pluggable persistence
+
+Jobs are accepted immediately, processed by a fixed number of in-process
+consumers and their state/results are written to a JobStore (SQLite by
+default) so they survive a restart: jobs that were queued or running when the
+process stopped are picked up again on the next start.
+"""
+from abc import ABC, abstractmethod
+from fastapi import HTTPException
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+import asyncio
+import sqlite3
+import tempfile
+import threading
+import logging
+import json
+import time
+import uuid
+import os
+
+from starlette.concurrency import run_in_threadpool
+
+from sources import fetcher
+
+logger = logging.getLogger(__name__)
+
+JOB_STORE = os.environ.get("DOCLING_JOB_STORE", "sqlite")
+JOB_DB_PATH = os.environ.get("DOCLING_JOB_DB", os.path.join(tempfile.gettempdir(), "docling-jobs.sqlite3"))
+JOB_WORKERS = int(os.environ.get("DOCLING_JOB_WORKERS", 2))
+JOB_TTL_HOURS = float(os.environ.get("DOCLING_JOB_TTL_HOURS", 24))
+# Seconds a job keeps retrying while the worker pool is full
+JOB_BUSY_WAIT = float(os.environ.get("DOCLING_JOB_BUSY_WAIT", 600))
+# Seconds a job keeps retrying while memory is too low to start it
+JOB_MEMORY_WAIT = float(os.environ.get("DOCLING_JOB_MEMORY_WAIT", 600))
+WEBHOOK_TIMEOUT = float(os.environ.get("DOCLING_WEBHOOK_TIMEOUT", 30))
+WEBHOOK_RETRIES = int(os.environ.get("DOCLING_WEBHOOK_RETRIES", 3))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobStore(ABC):
+    """Persistence interface for jobs; every job is a plain dict"""
+
+    @abstractmethod
+    def create(self, job: dict):
+        ...
+
+    @abstractmethod
+    def update(self, job_id: str, **fields):
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def unfinished(self) -> List[dict]:
+        """Jobs still queued or running, oldest first"""
+
+    @abstractmethod
+    def claim(self, job_id: str, now: float) -> bool:
+        """Atomically move a queued job to running; False if it is not queued"""
+
+    @abstractmethod
+    def requeue_running(self, now: float) -> int:
+        """Put jobs left running by a stopped process back in the queue"""
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def purge(self, older_than: float):
+        """Delete finished jobs last updated before the given timestamp"""
+
+
+class MemoryJobStore(JobStore):
+    """Non-persistent store, useful for tests and throwaway instances"""
+
+    def __init__(self):
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: dict):
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def unfinished(self) -> List[dict]:
+        with self._lock:
+            jobs = [dict(j) for j in self._jobs.values() if j["status"] in (QUEUED, RUNNING)]
+        return sorted(jobs, key=lambda j: j["created_at"])
+
+    def claim(self, job_id: str, now: float) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] != QUEUED:
+                return False
+            job.update(status=RUNNING, updated_at=now)
+            return True
+
+    def requeue_running(self, now: float) -> int:
+        with self._lock:
+            running = [job for job in self._jobs.values() if job["status"] == RUNNING]
+            for job in running:
+                job.update(status=QUEUED, updated_at=now)
+        return len(running)
+
+    def purge(self, older_than: float):
+        with self._lock:
+            for job_id in [
+                job_id for job_id, job in self._jobs.items()
+                if job["status"] in (SUCCEEDED, FAILED) and job["updated_at"] < older_than
+            ]:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore(JobStore):
+    """Store backed by a single SQLite file"""
+
+    _COLUMNS = ("id", "kind", "status", "payload", "result", "error",
+                "webhook_url", "created_at", "updated_at")
+    _JSON_COLUMNS = ("payload", "result")
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    webhook_url TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+
+    def _encode(self, fields: dict) -> dict:
+        return {
+            key: json.dumps(value) if key in self._JSON_COLUMNS and value is not None else value
+            for key, value in fields.items()
+        }
+
+    def _decode(self, row) -> dict:
+        job = dict(zip(self._COLUMNS, row))
+        for key in self._JSON_COLUMNS:
+            if job[key] is not None:
+                job[key] = json.loads(job[key])
+        return job
+
+    def create(self, job: dict):
+        row = self._encode(job)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO jobs ({', '.join(self._COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in self._COLUMNS)})",
+                [row.get(column) for column in self._COLUMNS]
+            )
+
+    def update(self, job_id: str, **fields):
+        row = self._encode(fields)
+        assignments = ", ".join(f"{key} = ?" for key in row)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?",
+                [*row.values(), job_id]
+            )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._decode(row) if row else None
+
+    def unfinished(self) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM jobs "
+                "WHERE status IN (?, ?) ORDER BY created_at",
+                (QUEUED, RUNNING)
+            ).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def claim(self, job_id: str, now: float) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, now, job_id, QUEUED)
+            )
+        return cursor.rowcount == 1
+
+    def requeue_running(self, now: float) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+                (QUEUED, now, RUNNING)
+            )
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def purge(self, older_than: float):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (SUCCEEDED, FAILED, older_than)
+            )
+
+
+def create_job_store(kind: str = JOB_STORE) -> JobStore:
+    """Build the configured JobStore ("sqlite" or "memory")"""
+    if kind == "sqlite":
+        return SQLiteJobStore(JOB_DB_PATH)
+    if kind == "memory":
+        return MemoryJobStore()
+    raise ValueError(f"Unsupported job store: {kind}")
+
+
+JobHandler = Callable[[dict], Awaitable[dict]]
+
+
+class JobManager:
+    """
+    In-process queue feeding jobs to registered async handlers
+
+    A handler receives the job payload and returns a JSON-serialisable dict;
+    a result with ``success: False`` or an exception marks the job failed.
+    The store is only opened in ``start()`` so nothing is shared across a fork.
+
+    Several processes (e.g. gunicorn workers) may share one SQLite store:
+    every process queues all waiting jobs on start, and a job is only run by
+    the process that claims it. Jobs interrupted by a restart are put back in
+    the queue by ``recover()``, which runs once per service start - in
+    ``start()`` for a single process, or in the gunicorn master before forking.
+    """
+
+    def __init__(
+        self,
+        store_factory: Callable[[], JobStore] = create_job_store,
+        workers: int = JOB_WORKERS,
+        retry_delay: float = 5,
+        busy_wait: float = JOB_BUSY_WAIT,
+        memory_wait: float = JOB_MEMORY_WAIT
+    ):
+        self.store_factory = store_factory
+        self.store: Optional[JobStore] = None
+        self.recovered = False
+        self.workers = workers
+        self.retry_delay = retry_delay
+        self.busy_wait = busy_wait
+        self.memory_wait = memory_wait
+        self._handlers: Dict[str, JobHandler] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # Jobs this process has claimed and not finished
+        self._claimed: Set[str] = set()
+
+    def register(self, kind: str, handler: JobHandler):
+        self._handlers[kind] = handler
+
+    @property
+    def queued(self) -> int:
+        """Job ids waiting in this process's queue"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def recover(self):
+        """Re-queue jobs that were running when the service last stopped (blocking)"""
+        store = self.store or self.store_factory()
+        try:
+            count = store.requeue_running(time.time())
+            if count:
+                logger.info(f"Re-queued {count} interrupted job(s)")
+        finally:
+            if store is not self.store:
+                store.close()
+        self.recovered = True
+
+    async def start(self):
+        """Start the consumers and re-enqueue jobs left over from a previous run"""
+        self.store = await run_in_threadpool(self.store_factory)
+        self._queue = asyncio.Queue()
+        if not self.recovered:
+            await run_in_threadpool(self.recover)
+        await run_in_threadpool(self.store.purge, time.time() - JOB_TTL_HOURS * 3600)
+        for job in await run_in_threadpool(self.store.unfinished):
+            logger.info(f"Resuming job {job['id']} ({job['kind']})")
+            self._queue.put_nowait(job["id"])
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the consumers, putting the jobs they were running back in the queue"""
+        interrupted = set(self._claimed)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.store is not None and interrupted:
+            # E.g. a recycled gunicorn worker: its replacement resumes them.
+            # Jobs already finished (only notifying their webhook) stay so.
+            for job_id in interrupted:
+                job = await run_in_threadpool(self.store.get, job_id)
+                if job and job["status"] == RUNNING:
+                    await run_in_threadpool(self.store.update, job_id, status=QUEUED, updated_at=time.time())
+                    logger.info(f"Re-queued interrupted job {job_id}")
+        if self.store is not None:
+            await run_in_threadpool(self.store.close)
+            self.store = None
+
+    async def submit(self, kind: str, payload: dict, webhook_url: Optional[str] = None) -> dict:
+        """
+        Persist a new job and queue it
+
+        Args:
+            kind: Registered handler name
+            payload: JSON-serialisable handler input
+            webhook_url: Optional URL notified with the final job state
+
+        Returns:
+            The stored job
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": QUEUED,
+            "payload": payload,
+            "result": None,
+            "error": None,
+            "webhook_url": webhook_url,
+            "created_at": now,
+            "updated_at": now
+        }
+        await run_in_threadpool(self.store.create, job)
+        self._queue.put_nowait(job["id"])
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await run_in_threadpool(self.store.get, job_id)
+
+    async def _consume(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Job {job_id} crashed: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        # Another process (or an earlier queue entry) may have taken the job
+        if not await run_in_threadpool(self.store.claim, job_id, time.time()):
+            return
+        self._claimed.add(job_id)
+        try:
+            await self._process(job_id)
+        finally:
+            self._claimed.discard(job_id)
+
+    async def _process(self, job_id: str):
+        job = await run_in_threadpool(self.store.get, job_id)
+
+        result, error = None, None
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            # E.g. a job stored by a version that had this kind
+            error = f"Unknown job kind: {job['kind']}"
+        started = time.monotonic()
+        while handler is not None:
+            try:
+                result = await handler(job["payload"])
+                if not result.get("success", True):
+                    error = result.get("error") or "Job failed"
+            except HTTPException as e:
+                waited = time.monotonic() - started
+                if e.status_code == 429 and waited < self.busy_wait:
+                    # Worker pool is saturated: wait instead of failing the job
+                    await asyncio.sleep(self.retry_delay)
+                    continue
+                if e.status_code == 503 and waited < self.memory_wait:
+                    # Memory is low: wait for running conversions to release it
+                    await asyncio.sleep(self.retry_delay)
+                    continue
+                error = str(e.detail)
+            except Exception as e:
+                error = str(e)
+            break
+
+        job.update(
+            status=FAILED if error else SUCCEEDED,
+            result=result,
+            error=error,
+            updated_at=time.time()
+        )
+        await run_in_threadpool(
+            self.store.update,
+            job_id,
+            status=job["status"],
+            result=result,
+            error=error,
+            updated_at=job["updated_at"]
+        )
+        logger.info(f"Job {job_id} {job['status']}")
+
+        if job["webhook_url"]:
+            await self._notify(job)
+
+    async def _notify(self, job: dict):
+        """POST the final job state to its webhook, retrying with backoff"""
+        body = public_view(job)
+        for attempt in range(WEBHOOK_RETRIES):
+            try:
+                response = await fetcher.client.post(
+                    job["webhook_url"], json=body, timeout=WEBHOOK_TIMEOUT
+                )
+                response.raise_for_status()
+                return
+            except Exception as e:
+                logger.warning(
+                    f"Webhook for job {job['id']} failed (attempt {attempt + 1}): {str(e)}"
+                )
+                await asyncio.sleep(2 ** attempt)
+
+
+def public_view(job: dict) -> dict:
+    """Job fields returned to API clients and webhooks"""
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"]
+    }
@@ -1,29 +1,157 @@
 """
 Docling Web Service - FastAPI wrapper for Docling document conversion
 """
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from docling.document_converter import DocumentConverter
-from docling.chunking import HybridChunker
-from transformers import AutoTokenizer
-from pydantic import BaseModel, HttpUrl
-from typing import Optional, List
-import tempfile
+from starlette import formparsers
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, HttpUrl, ValidationError, field_validator, model_validator
+from typing import Optional, List, Tuple, Union
+import asyncio
+import hashlib
+import json
+import time
 import os
-from pathlib import Path
 import logging
 
+import encoding
+import metrics
+import pipeline
+import sources
+import workers
+from cache import conversion_cache
+from chunk_index import chunk_index
+from embeddings import embedding_models, EMBEDDING_FORMATS
+from chunkers import registry as chunker_registry, UnknownTokenizerError
+from converters import registry as converter_registry, UnknownProfileError, LIGHT, LIGHT_ONLY
+from jobs import JobManager, public_view
+from singleflight import SingleFlight
+from warmup import warm_up
+from workers import pool, shard_pool, MemoryPressureError, PoolFullError, RETRY_AFTER, SHARD_WORKERS, WorkerPool
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Largest number of documents accepted by /chunk/batch
+BATCH_MAX_ITEMS = int(os.environ.get("DOCLING_BATCH_MAX_ITEMS", 50))
+
+# Largest /chunk/batch request body; bigger ones get 413 before being read
+BATCH_MAX_UPLOAD_MB = int(os.environ.get("DOCLING_BATCH_MAX_UPLOAD_MB", sources.MAX_UPLOAD_MB))
+
+# Batch documents downloaded ahead of the ones being converted
+BATCH_PREFETCH = int(os.environ.get("DOCLING_BATCH_PREFETCH", 2))
+
+# Multipart file parts that roll over to disk are moved into place by
+# sources.save_upload instead of being copied a second time
+formparsers.SpooledTemporaryFile = sources.UploadSpool
+
+# Background jobs for long conversions (handlers registered below the endpoints)
+job_manager = JobManager()
+
+# Identical conversions running concurrently are done once (see singleflight.py)
+conversions = SingleFlight()
+COALESCE = os.environ.get("DOCLING_COALESCE", "true").lower() not in ("0", "false", "no")
+
+# Seconds from process start to each startup milestone (see /ready)
+startup_timings = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background job processing and release workers on shutdown"""
+    started = time.perf_counter()
+    await job_manager.start()
+    # Load models in the background: /health answers at once, /ready once warm
+    warm_up_task = asyncio.create_task(run_in_threadpool(warm_up.run))
+    startup_timings["lifespan"] = round(time.perf_counter() - started, 3)
+    serving = metrics.process_age()
+    startup_timings["serving"] = round(serving, 3) if serving is not None else None
+    logger.info(
+        f"Startup: app imported after {startup_timings.get('imported')}s, "
+        f"lifespan took {startup_timings['lifespan']}s, serving after {startup_timings['serving']}s; "
+        f"models load in the background (see /ready)"
+    )
+    yield
+    warm_up_task.cancel()
+    await job_manager.stop()
+    await sources.fetcher.close()
+    pool.shutdown()
+    shard_pool.shutdown()
+
+
 app = FastAPI(
     title="Docling API",
     description="Document conversion service powered by Docling",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Reject oversized uploads and batch bodies before they are read"""
+    limits = {"/convert/file": sources.MAX_UPLOAD_MB, "/chunk/batch": BATCH_MAX_UPLOAD_MB}
+    limit_mb = limits.get(request.url.path)
+    if limit_mb is not None:
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > limit_mb * 1024 * 1024:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Upload exceeds the {limit_mb} MB limit"}
+            )
+    return await call_next(request)
+
+
+def client_identity(request: Request) -> Tuple[str, Optional[str]]:
+    """
+    Identify the caller for fair-share scheduling
+
+    Returns:
+        Tuple of (client id, API key or None): a hash of the API key
+        (X-API-Key or Authorization: Bearer), else X-Client-Id, else the
+        caller's address
+    """
+    api_key = request.headers.get("x-api-key")
+    authorization = request.headers.get("authorization", "")
+    if not api_key and authorization.lower().startswith("bearer "):
+        api_key = authorization[7:].strip()
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12], api_key
+    client_id = request.headers.get("x-client-id")
+    if client_id:
+        return client_id, None
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",")[0].strip(), None
+    return (request.client.host if request.client else "anonymous"), None
+
+
+@app.middleware("http")
+async def classify_request(request: Request, call_next):
+    """Set the scheduling class (client, API key priority) of the request"""
+    workers.classify_client(*client_identity(request))
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count requests and observe their latency per route"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", "unmatched")
+        metrics.REQUESTS.labels(endpoint, request.method, str(status)).inc()
+        metrics.REQUEST_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -33,45 +161,475 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize converter
-converter = DocumentConverter()
 
-# Initialize tokenizer for chunking (lazy loading)
-_tokenizer = None
+metrics.live.add(
+    "docling_pool_tasks", "Tasks running or waiting in a worker pool",
+    lambda: {("convert",): pool.in_flight, ("shard",): shard_pool.in_flight}, ["pool"]
+)
+metrics.live.add(
+    "docling_pool_queue_depth", "Tasks waiting for a free worker",
+    lambda: {
+        (name,): max(0, p.in_flight - p.max_workers)
+        for name, p in (("convert", pool), ("shard", shard_pool))
+    },
+    ["pool"]
+)
+metrics.live.add(
+    "docling_scheduler_waiting", "Tasks waiting for a worker, by pool and priority",
+    lambda: {
+        (name, priority): count
+        for name, p in (("convert", pool), ("shard", shard_pool))
+        for priority, count in p.waiting_by_priority().items()
+    },
+    ["pool", "priority"]
+)
+metrics.live.add(
+    "docling_pool_memory_reserved_bytes", "Estimated memory of the tasks running in each pool",
+    lambda: {
+        (name,): p.reserved_mb * workers.MB
+        for name, p in (("convert", pool), ("shard", shard_pool))
+    },
+    ["pool"]
+)
+metrics.live.add(
+    "docling_conversions_deduplicated_in_flight", "Distinct conversions other requests can join",
+    lambda: {(): conversions.in_flight}
+)
+metrics.live.add(
+    "docling_job_queue_depth", "Background jobs waiting in this process",
+    lambda: {(): job_manager.queued}
+)
+
+
+def _cache_stats():
+    stats = conversion_cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        ("hits",): stats["hits"],
+        ("misses",): stats["misses"],
+        ("hit_ratio",): stats["hits"] / lookups if lookups else None
+    }
+
+
+metrics.live.add(
+    "docling_conversion_cache", "Conversion cache hits, misses and hit ratio of this process",
+    _cache_stats, ["stat"]
+)
+
+
+async def run_blocking(fn, *args, worker_pool: WorkerPool = pool):
+    """
+    Run a blocking pipeline step in the worker pool
+
+    Translates pool back-pressure and timeouts into HTTP errors so the
+    endpoints can let them propagate unchanged.
+    """
+    try:
+        return await worker_pool.run(fn, *args)
+    except PoolFullError as e:
+        logger.warning(str(e))
+        raise HTTPException(
+            status_code=429,
+            detail="Server is busy, retry later",
+            headers={"Retry-After": str(RETRY_AFTER)}
+        )
+    except MemoryPressureError as e:
+        raise memory_error(e)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail="Document processing timed out"
+        )
+
+
+def memory_error(error: MemoryPressureError) -> HTTPException:
+    """503 answer for work refused because memory is low"""
+    logger.warning(str(error))
+    return HTTPException(
+        status_code=503,
+        detail="Not enough memory to process the document now, retry later",
+        headers={"Retry-After": str(RETRY_AFTER)}
+    )
+
+
+async def convert_document(
+    source: sources.SourceFile,
+    page_range: Optional[Tuple[int, int]] = None,
+    parallel_pages: Optional[bool] = None,
+    profile: Optional[str] = None
+):
+    """
+    Convert a source, splitting large PDFs into page shards converted in parallel
+
+    PDFs are sharded when parallel_pages is true, or when it is unset and
+    the pages to convert reach DOCLING_SHARD_MIN_PAGES. Shards run in the
+    shard process pool, at most DOCLING_SHARD_WORKERS of them at a time, and
+    are merged back in page order; the first failing shard fails the
+    conversion once the shards already running have finished. Small Markdown,
+    text and HTML documents (the light profile) skip the worker pool: they
+    need no models and should not wait behind PDF conversions. Other
+    documents are refused with 503 when their estimated memory would not
+    leave DOCLING_MEMORY_MIN_FREE_MB free.
+
+    Args:
+        source: Local copy of the document
+        page_range: Optional 1-based inclusive (first, last) pages to convert
+        parallel_pages: Force (True) or disable (False) sharding
+        profile: Concrete pipeline profile
+
+    Returns:
+        The converted DoclingDocument
+    """
+    light = profile == LIGHT and source.size <= pipeline.LIGHT_MAX_BYTES
+    shards = []
+    # Estimated size in pages, for scheduling and the memory check
+    cost = source.size / workers.SCHEDULER_BYTES_PER_PAGE
+    page_count = None if light else await run_in_threadpool(pipeline.count_pages, source)
+    if page_count:
+        first, last = page_range or (1, page_count)
+        cost = max(0, min(last, page_count) - first + 1)
+        if parallel_pages is not False and SHARD_WORKERS > 1:
+            shards = pipeline.plan_shards(page_count, page_range)
+            pages = sum(last - first + 1 for first, last in shards)
+            if not parallel_pages and pages < pipeline.SHARD_MIN_PAGES:
+                shards = []
+    workers.set_cost(cost)
+    if not light:
+        # Shard processes each hold one shard: at most SHARD_WORKERS shards'
+        # pages are in memory at once, however long the document. Worker
+        # processes not started yet add their models
+        memory_cost, extra_mb = cost, pool.spawn_memory_mb()
+        if len(shards) > 1:
+            memory_cost = min(cost, min(len(shards), SHARD_WORKERS) * pipeline.SHARD_PAGES)
+            extra_mb = shard_pool.spawn_memory_mb(min(len(shards), SHARD_WORKERS))
+        try:
+            workers.check_memory(memory_cost, extra_mb)
+        except MemoryPressureError as e:
+            raise memory_error(e)
+
+    started = time.perf_counter()
+    with metrics.CONVERSIONS_IN_FLIGHT.track_inprogress(), metrics.stage("convert"):
+        if light:
+            doc, docling_timings = await run_in_threadpool(
+                pipeline.convert_source, source, None, profile
+            )
+        elif len(shards) <= 1:
+            doc, docling_timings = await run_blocking(
+                pipeline.convert_source, source, page_range, profile
+            )
+        else:
+            logger.info(f"Converting {source.name} in {len(shards)} page shards")
+            # At most SHARD_WORKERS shards of a document are in the shard pool
+            # at once, so a long PDF cannot fill its queue on its own
+            in_pool = asyncio.Semaphore(SHARD_WORKERS)
+
+            async def convert_shard(shard):
+                async with in_pool:
+                    workers.set_cost(shard[1] - shard[0] + 1)
+                    return await run_blocking(
+                        pipeline.convert_source, source, shard, profile, worker_pool=shard_pool
+                    )
+
+            tasks = [asyncio.ensure_future(convert_shard(shard)) for shard in shards]
+            try:
+                results = await asyncio.gather(*tasks)
+            except BaseException:
+                # Drop the shards not started yet and wait for the running
+                # ones, which still read the source
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+            doc = await run_blocking(
+                pipeline.merge_documents, [doc for doc, _ in results], shards[0][0]
+            )
+            docling_timings = {}
+            for _, shard_timings in results:
+                for scope, seconds in shard_timings.items():
+                    docling_timings[scope] = round(docling_timings.get(scope, 0) + seconds, 4)
 
-def get_tokenizer():
-    """Lazy load tokenizer to avoid startup delay"""
-    global _tokenizer
-    if _tokenizer is None:
-        logger.info("Loading tokenizer: sentence-transformers/all-MiniLM-L6-v2")
-        _tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
-    return _tokenizer
+    elapsed = time.perf_counter() - started
+    pages = len(doc.pages)
+    if pages:
+        metrics.PAGES_CONVERTED.inc(pages)
+        metrics.PAGES_PER_SECOND.observe(pages / elapsed)
+    metrics.add_details("docling", docling_timings)
+    return doc
+
+
+async def load_document(source: sources.SourceFile, options=None):
+    """
+    Get the DoclingDocument for a source, converting it only on a cache miss
+
+    Args:
+        source: Local copy of the document
+        options: Optional ConversionOptions (page_range, parallel_pages, profile,
+            priority)
 
+    Concurrent requests for the same source and options share one
+    conversion; the ones that joined it report cache.coalesced.
+
+    Returns:
+        Tuple of (DoclingDocument, conversion metadata for the response:
+        the pipeline "profile" used and "cache" hit/miss details)
+    """
+    page_range = tuple(options.page_range) if options is not None and options.page_range else None
+    parallel_pages = options.parallel_pages if options is not None else None
+    if options is not None and options.priority:
+        workers.set_priority(options.priority)
+    try:
+        profile = await run_in_threadpool(
+            pipeline.pick_profile, source, options.profile if options is not None else None
+        )
+    except UnknownProfileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if LIGHT_ONLY and profile != LIGHT:
+        raise HTTPException(
+            status_code=415,
+            detail=f"{source.name}: this instance only converts Markdown, text and HTML"
+        )
+
+    # Sharding does not change the result, so it is not part of the key
+    key_options = {"profile": profile}
+    if page_range:
+        key_options["page_range"] = list(page_range)
+    key = conversion_cache.make_key(source.sha256, **key_options)
+    with metrics.stage("cache_lookup"):
+        doc, tier = await run_in_threadpool(conversion_cache.get, key)
+    coalesced = False
+    if doc is None:
+        async def convert_and_store():
+            # Others may join, so the conversion can outlive this caller: it
+            # works on its own copy of the source
+            shared_source = await run_in_threadpool(source.clone)
+            try:
+                converted = await convert_document(shared_source, page_range, parallel_pages, profile)
+            finally:
+                shared_source.cleanup()
+            await run_in_threadpool(conversion_cache.put, key, converted)
+            return converted
+
+        started = time.perf_counter()
+        if COALESCE:
+            doc, coalesced = await conversions.run(key, convert_and_store)
+        else:
+            doc = await convert_and_store()
+        if coalesced:
+            metrics.COALESCED.inc()
+            metrics.record("coalesced_wait", time.perf_counter() - started)
 
-class URLConvertRequest(BaseModel):
+    cache_metadata = {"hit": tier is not None, "tier": tier, "coalesced": coalesced}
+    cache_metadata.update(conversion_cache.stats())
+    return doc, {"profile": profile, "cache": cache_metadata}
+
+
+def check_profile(options):
+    """Reject unknown pipeline profiles before any download or conversion"""
+    try:
+        converter_registry.resolve(options.profile)
+    except UnknownProfileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def chunk_settings(options) -> pipeline.ChunkSettings:
+    """
+    Build pipeline ChunkSettings from a ChunkRequest-like model
+
+    Raises:
+        HTTPException: 400 if the requested tokenizer is not configured, for
+            a diff without a file_id, an unknown embedding_format or an
+            unknown include_metadata field
+    """
+    if options.diff and not options.file_id:
+        raise HTTPException(status_code=400, detail="diff requires a file_id")
+    if options.embedding_format not in EMBEDDING_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported embedding format: {options.embedding_format} "
+                   f"(available: {', '.join(EMBEDDING_FORMATS)})"
+        )
+    unknown = [name for name in options.include_metadata if name not in pipeline.CHUNK_METADATA_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported metadata field: {', '.join(unknown)} "
+                   f"(available: {', '.join(pipeline.CHUNK_METADATA_FIELDS)})"
+        )
+    try:
+        tokenizer = chunker_registry.resolve(options.tokenizer)
+    except UnknownTokenizerError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return pipeline.ChunkSettings(
+        max_tokens=options.max_tokens,
+        merge_peers=options.merge_peers,
+        tokenizer=tokenizer,
+        file_id=options.file_id,
+        count_tokens=options.count_tokens,
+        embed=options.embed,
+        contextualize=options.contextualize,
+        embedding_format=options.embedding_format,
+        include_metadata=tuple(dict.fromkeys(options.include_metadata))
+    )
+
+
+async def fetch_source(url: str) -> sources.SourceFile:
+    """Download a URL source, answering 413/504 for oversized or slow downloads"""
+    try:
+        with metrics.stage("download"):
+            return await sources.fetcher.fetch(url)
+    except sources.SourceTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Download timed out: {url}")
+
+
+async def save_upload(file: UploadFile) -> sources.SourceFile:
+    """Copy an upload to a SourceFile, answering 413 when it is too large"""
+    try:
+        with metrics.stage("upload"):
+            return await sources.save_upload(file)
+    except sources.SourceTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+async def encoded(http_request: Request, response: BaseModel) -> Response:
+    """Serialise a response model as negotiated by the client (see encoding.py)"""
+    with metrics.stage("encode"):
+        return await run_in_threadpool(encoding.encode_response, http_request, response)
+
+
+def check_output_format(output_format: Union[str, List[str]]):
+    """Reject unknown output formats (or an empty list) before any conversion work is done"""
+    output_formats = [output_format] if isinstance(output_format, str) else output_format
+    if not output_formats:
+        raise HTTPException(status_code=400, detail="No output format requested")
+    for name in output_formats:
+        if name.lower() not in pipeline.SUPPORTED_FORMATS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported output format: {name}"
+            )
+
+
+async def export_content(doc, output_format: Union[str, List[str]]):
+    """
+    Export a document to one format, or to several from the same document
+
+    Returns:
+        The export for a single format name, {format: export} for a list
+    """
+    with metrics.stage("export"):
+        if isinstance(output_format, str):
+            return await run_blocking(pipeline.export_document, doc, output_format)
+        return await run_blocking(pipeline.export_formats, doc, output_format)
+
+
+class ConversionOptions(BaseModel):
+    """Conversion options shared by the request models"""
+    page_range: Optional[Tuple[int, int]] = None
+    parallel_pages: Optional[bool] = None
+    profile: Optional[str] = None
+    # Scheduling class: "interactive" or "bulk" (ignored for API keys with a
+    # configured priority)
+    priority: Optional[str] = None
+
+    @field_validator("page_range")
+    @classmethod
+    def check_page_range(cls, value):
+        if value is not None and not 1 <= value[0] <= value[1]:
+            raise ValueError("page_range must be [first, last] with 1 <= first <= last")
+        return value
+
+    @field_validator("priority")
+    @classmethod
+    def check_priority(cls, value):
+        if value is not None and value not in workers.PRIORITIES:
+            raise ValueError(f"priority must be one of: {', '.join(workers.PRIORITIES)}")
+        return value
+
+
+class URLConvertRequest(ConversionOptions):
     url: HttpUrl
-    output_format: str = "markdown"
+    # One format, or a list exported from the same conversion
+    output_format: Union[str, List[str]] = "markdown"
 
 
 class ConvertResponse(BaseModel):
     success: bool
-    content: Optional[str] = None
+    # Exported text, the document object for output_format "json", or
+    # {format: export} when output_format is a list
+    content: Optional[Union[str, dict]] = None
     error: Optional[str] = None
     metadata: Optional[dict] = None
 
 
-class ChunkRequest(BaseModel):
+class ChunkRequest(ConversionOptions):
     url: HttpUrl
     max_tokens: int = 512
     merge_peers: bool = True
     file_id: Optional[str] = None
+    count_tokens: bool = True
+    tokenizer: Optional[str] = None
+    diff: bool = False
+    embed: bool = False
+    contextualize: bool = False
+    embedding_format: str = "base64"
+    # Extra per-chunk metadata: headings, pages, bboxes, labels, contextualized
+    include_metadata: List[str] = []
+
+
+class BatchChunkItem(ConversionOptions):
+    url: Optional[HttpUrl] = None
+    upload: Optional[str] = None
+    max_tokens: int = 512
+    merge_peers: bool = True
+    file_id: Optional[str] = None
+    count_tokens: bool = True
+    tokenizer: Optional[str] = None
+    diff: bool = False
+    embed: bool = False
+    contextualize: bool = False
+    embedding_format: str = "base64"
+    # Extra per-chunk metadata: headings, pages, bboxes, labels, contextualized
+    include_metadata: List[str] = []
+
+    @model_validator(mode="after")
+    def check_source(self):
+        if (self.url is None) == (self.upload is None):
+            raise ValueError("Each item needs exactly one of 'url' or 'upload'")
+        return self
+
+
+class BatchChunkRequest(BaseModel):
+    items: List[BatchChunkItem]
+
+
+class JobConvertRequest(URLConvertRequest):
+    webhook_url: Optional[HttpUrl] = None
+
+
+class JobChunkRequest(ChunkRequest):
+    webhook_url: Optional[HttpUrl] = None
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
 
 
 class ChunkObject(BaseModel):
     content: str
     chunk: int
+    chunk_id: str
     chunk_size: int
-    tokens: int
+    tokens: Optional[int] = None
+    # float32 vector, base64 of little-endian bytes or a list (embedding_format)
+    embedding: Optional[Union[str, List[float]]] = None
     metadata: Optional[dict] = None
 
 
@@ -80,7 +638,25 @@ class ChunkResponse(BaseModel):
     chunks: Optional[List[ChunkObject]] = None
     total_chunks: Optional[int] = None
     total_tokens: Optional[int] = None
+    diff: Optional[dict] = None
     error: Optional[str] = None
+    metadata: Optional[dict] = None
+
+
+class ProcessRequest(ChunkRequest):
+    # Any of SUPPORTED_FORMATS plus "chunks"
+    outputs: List[str] = ["markdown", "chunks"]
+
+
+class ProcessResponse(BaseModel):
+    success: bool
+    outputs: Optional[dict] = None
+    chunks: Optional[List[ChunkObject]] = None
+    total_chunks: Optional[int] = None
+    total_tokens: Optional[int] = None
+    diff: Optional[dict] = None
+    error: Optional[str] = None
+    metadata: Optional[dict] = None
 
 
 @app.get("/")
@@ -94,7 +670,16 @@ async def root():
             "convert_url": "/convert/url",
             "convert_file": "/convert/file",
             "chunk": "/chunk",
-            "health": "/health"
+            "chunk_batch": "/chunk/batch",
+            "process": "/process",
+            "jobs_convert": "/jobs/convert",
+            "jobs_chunk": "/jobs/chunk",
+            "job_status": "/jobs/{job_id}",
+            "chunk_index": "/chunk/index/{file_id}",
+            "chunk_index_ack": "/chunk/index/{file_id}/ack",
+            "health": "/health",
+            "ready": "/ready",
+            "metrics": "/metrics"
         }
     }
 
@@ -105,8 +690,35 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness endpoint: 200 once the startup warm-up has finished, 503 before
+
+    Returns:
+        Warm-up status with per-step timings in seconds, and the startup
+        milestones (seconds after process start)
+    """
+    status = warm_up.status()
+    return JSONResponse(
+        status_code=200 if status["ready"] else 503,
+        content={
+            "status": "ready" if status["ready"] else "warming_up",
+            "warmup": status,
+            "startup": startup_timings
+        }
+    )
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics in the text exposition format"""
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
+
 @app.post("/convert/url", response_model=ConvertResponse)
-async def convert_from_url(request: URLConvertRequest):
+async def convert_from_url(request: URLConvertRequest, http_request: Request):
     """
     Convert a document from URL to the specified format
     
@@ -114,191 +726,714 @@ async def convert_from_url(request: URLConvertRequest):
         request: URLConvertRequest containing URL and output format
         
     Returns:
-        ConvertResponse with converted content
+        ConvertResponse with converted content, as JSON or MessagePack
+        depending on the Accept header (see encoding.py)
     """
+    check_output_format(request.output_format)
+    check_profile(request)
+    return await encoded(http_request, await convert_url(request))
+
+
+async def convert_url(request: URLConvertRequest) -> ConvertResponse:
+    """Download and convert a document into a single ConvertResponse"""
+    timings = metrics.start_timings()
+    source = None
     try:
         logger.info(f"Converting document from URL: {request.url}")
         
-        # Convert the document
-        result = converter.convert(str(request.url))
+        # Download and convert the document (skipped on a cache hit)
+        source = await fetch_source(str(request.url))
+        doc, conversion_metadata = await load_document(source, request)
         
         # Export based on format
-        if request.output_format.lower() == "markdown":
-            content = result.document.export_to_markdown()
-        elif request.output_format.lower() == "json":
-            content = result.document.export_to_dict()
-        elif request.output_format.lower() == "html":
-            content = result.document.export_to_html()
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported output format: {request.output_format}"
-            )
+        content = await export_content(doc, request.output_format)
         
         # Extract metadata
         metadata = {
-            "num_pages": len(result.document.pages) if hasattr(result.document, 'pages') else None,
+            "num_pages": len(doc.pages) if hasattr(doc, 'pages') else None,
             "source": str(request.url),
-            "format": request.output_format
+            "format": request.output_format,
+            **conversion_metadata,
+            "timings": timings
         }
         
         return ConvertResponse(
             success=True,
-            content=content if isinstance(content, str) else str(content),
+            content=content,
             metadata=metadata
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error converting document: {str(e)}")
         return ConvertResponse(
             success=False,
             error=str(e)
         )
+    finally:
+        if source:
+            source.cleanup()
 
 
 @app.post("/convert/file", response_model=ConvertResponse)
 async def convert_from_file(
+    http_request: Request,
     file: UploadFile = File(...),
-    output_format: str = Form("markdown")
+    output_format: str = Form("markdown"),
+    page_range: Optional[str] = Form(None),
+    parallel_pages: Optional[bool] = Form(None),
+    profile: Optional[str] = Form(None),
+    priority: Optional[str] = Form(None)
 ):
     """
     Convert an uploaded document file to the specified format
     
     Args:
         file: Uploaded file
-        output_format: Desired output format (markdown, json, html)
+        output_format: Desired output format (markdown, json, html, doctags), or
+            several separated by commas
+        page_range: Optional "first-last" pages to convert (1-based, inclusive)
+        parallel_pages: Force (true) or disable (false) page-sharded conversion
+        profile: Pipeline profile (fast, full or auto)
+        priority: Scheduling class (interactive or bulk)
         
     Returns:
-        ConvertResponse with converted content
+        ConvertResponse with converted content, as JSON or MessagePack
+        depending on the Accept header (see encoding.py)
     """
-    temp_file = None
+    if "," in output_format:
+        output_format = [name.strip() for name in output_format.split(",") if name.strip()]
+    check_output_format(output_format)
+    try:
+        options = ConversionOptions(
+            page_range=page_range.split("-", 1) if page_range else None,
+            parallel_pages=parallel_pages,
+            profile=profile,
+            priority=priority
+        )
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    check_profile(options)
+    timings = metrics.start_timings()
+    source = None
     try:
         logger.info(f"Converting uploaded file: {file.filename}")
         
-        # Save uploaded file to temporary location
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(file.filename).suffix) as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
+        # Stream the upload to a temporary location (small files stay in memory)
+        source = await save_upload(file)
         
-        # Convert the document
-        result = converter.convert(temp_file_path)
+        # Convert the document (skipped on a cache hit)
+        doc, conversion_metadata = await load_document(source, options)
         
         # Export based on format
-        if output_format.lower() == "markdown":
-            converted_content = result.document.export_to_markdown()
-        elif output_format.lower() == "json":
-            converted_content = result.document.export_to_dict()
-        elif output_format.lower() == "html":
-            converted_content = result.document.export_to_html()
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported output format: {output_format}"
-            )
+        converted_content = await export_content(doc, output_format)
         
         # Extract metadata
         metadata = {
             "filename": file.filename,
-            "num_pages": len(result.document.pages) if hasattr(result.document, 'pages') else None,
-            "format": output_format
+            "num_pages": len(doc.pages) if hasattr(doc, 'pages') else None,
+            "format": output_format,
+            **conversion_metadata,
+            "timings": timings
         }
         
-        return ConvertResponse(
+        response = ConvertResponse(
             success=True,
-            content=converted_content if isinstance(converted_content, str) else str(converted_content),
+            content=converted_content,
             metadata=metadata
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error converting file: {str(e)}")
-        return ConvertResponse(
+        response = ConvertResponse(
             success=False,
             error=str(e)
         )
     finally:
         # Clean up temporary file
-        if temp_file and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except Exception as e:
-                logger.warning(f"Failed to delete temporary file: {str(e)}")
+        if source:
+            source.cleanup()
+    return await encoded(http_request, response)
+
+
+async def chunk_loaded_document(doc, settings: pipeline.ChunkSettings, diff: bool = False) -> dict:
+    """
+    Chunk an already converted document
+
+    With diff the chunk ids are compared with the ones last acknowledged for
+    the file_id: only the added chunks are returned, and "diff" lists the
+    added, unchanged and removed chunk ids plus the "revision" to
+    acknowledge (see chunk_index.py). total_chunks and total_tokens still
+    cover the whole document.
+
+    With settings.embed every returned chunk carries its embedding; in a
+    diff, chunks already acknowledged for the file_id are not embedded.
+
+    Returns:
+        The chunks, total_chunks, total_tokens and diff response fields
+    """
+    skip_ids = frozenset()
+    if diff and settings.embed:
+        skip_ids = frozenset(await run_in_threadpool(chunk_index.get, settings.file_id) or [])
+    chunks, total_tokens, chunk_timings = await run_blocking(
+        pipeline.chunk_document, doc, settings, skip_ids
+    )
+    for name, seconds in chunk_timings.items():
+        metrics.record(name, seconds)
+    total_chunks = len(chunks)
+
+    if diff:
+        diff = await run_in_threadpool(
+            chunk_index.update, settings.file_id, [chunk["chunk_id"] for chunk in chunks]
+        )
+        added = set(diff["added"])
+        chunks = [chunk for chunk in chunks if chunk["chunk_id"] in added]
+    else:
+        diff = None
+
+    return {
+        "chunks": [ChunkObject(**chunk) for chunk in chunks],
+        "total_chunks": total_chunks,
+        "total_tokens": total_tokens,
+        "diff": diff
+    }
+
+
+def embedding_metadata(settings: pipeline.ChunkSettings) -> dict:
+    """Response metadata describing the embeddings, if any were requested"""
+    if not settings.embed:
+        return {}
+    return {
+        "embedding": {
+            "model": embedding_models.model_id(settings.tokenizer),
+            "format": settings.embedding_format,
+            "dtype": "float32",
+            "normalized": True,
+            "contextualized": settings.contextualize
+        }
+    }
+
+
+async def chunk_source(source: sources.SourceFile, options) -> ChunkResponse:
+    """
+    Convert (or fetch from cache) and chunk a local document
+
+    Args:
+        source: Local copy of the document
+        options: ChunkRequest or BatchChunkItem carrying the chunking settings
+            (see chunk_loaded_document for options.diff)
+
+    Returns:
+        ChunkResponse with array of chunks compatible with PGVector
+    """
+    settings = chunk_settings(options)
+    doc, conversion_metadata = await load_document(source, options)
+    chunk_fields = await chunk_loaded_document(doc, settings, options.diff)
+
+    return ChunkResponse(
+        success=True,
+        **chunk_fields,
+        metadata={
+            **conversion_metadata,
+            **embedding_metadata(settings),
+            "timings": metrics.current_timings()
+        }
+    )
+
+
+def wants_ndjson(http_request: Request, stream: bool) -> bool:
+    """Whether the client asked for a streamed NDJSON response"""
+    return stream or "application/x-ndjson" in http_request.headers.get("accept", "")
 
 
 @app.post("/chunk", response_model=ChunkResponse)
-async def chunk_document(request: ChunkRequest):
+async def chunk_document(request: ChunkRequest, http_request: Request, stream: bool = False):
     """
     Chunk a document from URL using HybridChunker
     
+    With ?stream=true or "Accept: application/x-ndjson" the chunks are
+    streamed as NDJSON while the chunker produces them (see
+    stream_chunk_document) instead of being returned in one body.
+    
     Args:
         request: ChunkRequest containing URL, max_tokens, and merge_peers settings
+        stream: Stream chunks as NDJSON
         
     Returns:
-        ChunkResponse with array of chunks compatible with PGVector
+        ChunkResponse with array of chunks compatible with PGVector, as
+        JSON or MessagePack depending on the Accept header (see encoding.py)
     """
+    chunk_settings(request)
+    check_profile(request)
+    if wants_ndjson(http_request, stream):
+        response = await stream_chunk_document(request)
+    else:
+        response = await chunk_from_url(request)
+    if isinstance(response, Response):
+        return response
+    return await encoded(http_request, response)
+
+
+async def chunk_from_url(request: ChunkRequest) -> ChunkResponse:
+    """Download, convert and chunk a document into a single ChunkResponse"""
+    metrics.start_timings()
+    source = None
     try:
         logger.info(f"Chunking document from URL: {request.url}")
         
-        # Step 1: Convert the document
-        result = converter.convert(str(request.url))
-        doc = result.document
-        
-        # Step 2: Get tokenizer (lazy loaded)
-        tokenizer = get_tokenizer()
-        
-        # Step 3: Create HybridChunker
-        chunker = HybridChunker(
-            tokenizer=tokenizer,
-            max_tokens=request.max_tokens,
-            merge_peers=request.merge_peers
-        )
-        
-        # Step 4: Generate chunks
-        chunk_iter = chunker.chunk(dl_doc=doc)
-        chunks_list = list(chunk_iter)
+        # Step 1: Download the document
+        source = await fetch_source(str(request.url))
         
-        # Step 5: Format chunks for PGVector compatibility
-        formatted_chunks = []
-        total_tokens = 0
+        # Step 2: Convert (skipped on a cache hit), chunk and count tokens
+        response = await chunk_source(source, request)
         
-        for i, chunk in enumerate(chunks_list):
-            # Get chunk text
-            chunk_text = chunk.text
-            
-            # Calculate tokens
-            tokens = tokenizer.encode(chunk_text)
-            token_count = len(tokens)
-            total_tokens += token_count
-            
-            # Create clean metadata with only file_id
-            chunk_metadata = {}
-            if request.file_id:
-                chunk_metadata['file_id'] = request.file_id
-            
-            # Format matching your PGVector structure
-            formatted_chunks.append(ChunkObject(
-                content=chunk_text,
-                chunk=i,
-                chunk_size=len(chunk_text),
-                tokens=token_count,
-                metadata=chunk_metadata
-            ))
+        logger.info(f"Successfully chunked document into {response.total_chunks} chunks")
         
-        logger.info(f"Successfully chunked document into {len(formatted_chunks)} chunks")
+        return response
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error chunking document: {str(e)}")
         return ChunkResponse(
-            success=True,
-            chunks=formatted_chunks,
-            total_chunks=len(formatted_chunks),
-            total_tokens=total_tokens
+            success=False,
+            error=str(e)
         )
-        
+    finally:
+        if source:
+            source.cleanup()
+
+
+async def stream_chunk_document(request: ChunkRequest):
+    """
+    Download and convert a document, then stream its chunks as NDJSON
+
+    Failures before the first chunk return the usual ChunkResponse. Once
+    streaming, every line is one chunk object; the last line is a summary
+    {"done": true, "success": ..., "total_chunks": ..., "total_tokens": ...}
+    that also carries the error if chunking failed part way.
+
+    With request.diff only chunks missing from the file_id's acknowledged
+    ids are streamed and the summary carries the diff. The run's ids are
+    only stored (as the pending revision) once the whole document has been
+    chunked.
+    """
+    settings = chunk_settings(request)
+    timings = metrics.start_timings()
+    source = None
+    try:
+        logger.info(f"Streaming chunks of document from URL: {request.url}")
+        source = await fetch_source(str(request.url))
+        doc, conversion_metadata = await load_document(source, request)
+        previous = None
+        if request.diff:
+            previous = frozenset(await run_in_threadpool(chunk_index.get, settings.file_id) or [])
+
+        # Chunk groups are produced by pool tasks, one per group, so streaming
+        # gets the same back-pressure, timeouts and scheduling as other work.
+        # The first group is produced here: a busy pool still answers 429.
+        started = time.perf_counter()
+        if pool.mode == "process":
+            # A generator cannot be sent to a worker process: chunk in one task
+            batches = None
+            first_batch, _, _ = await run_blocking(
+                pipeline.chunk_document, doc, settings, previous or frozenset()
+            )
+        else:
+            batches = pipeline.iter_chunk_batches(doc, settings, skip_ids=previous or frozenset())
+            first_batch = await run_blocking(pipeline.next_chunk_batch, batches)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error chunking document: {str(e)}")
         return ChunkResponse(
             success=False,
             error=str(e)
         )
+    finally:
+        if source:
+            source.cleanup()
+
+    async def stream_lines():
+        total_chunks = 0
+        total_tokens = 0
+        chunk_ids = []
+        summary = {"done": True, "success": True}
+        batch = first_batch
+        try:
+            while batch is not None:
+                for chunk in batch:
+                    total_chunks += 1
+                    chunk_ids.append(chunk["chunk_id"])
+                    if chunk["tokens"] is not None:
+                        total_tokens += chunk["tokens"]
+                    if previous is None or chunk["chunk_id"] not in previous:
+                        yield encoding.json_line(chunk)
+                batch = await run_blocking(pipeline.next_chunk_batch, batches) if batches is not None else None
+            if request.diff:
+                summary["diff"] = await run_in_threadpool(chunk_index.update, settings.file_id, chunk_ids)
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.error(f"Error streaming chunks: {error}")
+            summary.update(success=False, error=error)
+        else:
+            logger.info(f"Successfully streamed {total_chunks} chunks")
+        # Chunking and token counting interleave while streaming: one stage
+        elapsed = time.perf_counter() - started
+        metrics.STAGE_LATENCY.labels("chunk").observe(elapsed)
+        timings["chunk"] = round(elapsed, 4)
+        summary.update(
+            total_chunks=total_chunks,
+            total_tokens=total_tokens if settings.count_tokens else None,
+            metadata={**conversion_metadata, **embedding_metadata(settings), "timings": timings}
+        )
+        yield encoding.json_line(summary)
+
+    return StreamingResponse(stream_lines(), media_type="application/x-ndjson")
+
+
+@app.post("/process", response_model=ProcessResponse)
+async def process_document(request: ProcessRequest, http_request: Request):
+    """
+    Convert a document once and return several exports and/or its chunks
+
+    Every requested output is computed from the same DoclingDocument; the
+    exports and the chunking run concurrently and nothing that was not
+    requested is computed.
+
+    Args:
+        request: ChunkRequest fields plus "outputs", any of markdown, json,
+            html, doctags and chunks
+
+    Returns:
+        ProcessResponse with {format: export} in "outputs" and the
+        ChunkResponse fields when chunks were requested
+    """
+    output_formats = [name for name in request.outputs if name.lower() != "chunks"]
+    wants_chunks = len(output_formats) < len(request.outputs)
+    if output_formats or not wants_chunks:
+        check_output_format(output_formats)
+    settings = chunk_settings(request) if wants_chunks else None
+    check_profile(request)
+    return await encoded(http_request, await process_url(request, output_formats, settings))
+
+
+async def process_url(request: ProcessRequest, output_formats: List[str],
+                      settings: Optional[pipeline.ChunkSettings]) -> ProcessResponse:
+    """Download and convert a document, then export and/or chunk it"""
+    timings = metrics.start_timings()
+    source = None
+    try:
+        logger.info(f"Processing document from URL: {request.url} ({', '.join(request.outputs)})")
+        source = await fetch_source(str(request.url))
+        doc, conversion_metadata = await load_document(source, request)
+
+        async def no_output():
+            return None
+
+        exports, chunk_fields = await asyncio.gather(
+            export_content(doc, output_formats) if output_formats else no_output(),
+            chunk_loaded_document(doc, settings, request.diff) if settings else no_output()
+        )
+
+        return ProcessResponse(
+            success=True,
+            outputs=exports,
+            **(chunk_fields or {}),
+            metadata={
+                "num_pages": len(doc.pages),
+                "source": str(request.url),
+                "outputs": request.outputs,
+                **conversion_metadata,
+                **(embedding_metadata(settings) if settings else {}),
+                "timings": timings
+            }
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing document: {str(e)}")
+        return ProcessResponse(
+            success=False,
+            error=str(e)
+        )
+    finally:
+        if source:
+            source.cleanup()
+
+
+class ChunkIndexAck(BaseModel):
+    revision: str
+
+
+@app.post("/chunk/index/{file_id}/ack")
+async def acknowledge_chunk_index(file_id: str, request: ChunkIndexAck):
+    """
+    Acknowledge a diff once it has been applied to the vector store
+
+    The revision returned in "diff" becomes the base of the next diff of the
+    file_id. Until then, repeated diff runs (e.g. retries after a lost
+    response) are compared with the previous base and report the same
+    changes. Acknowledging twice is harmless.
+    """
+    acknowledged = await run_in_threadpool(chunk_index.acknowledge, file_id, request.revision)
+    if acknowledged is None:
+        raise HTTPException(status_code=404, detail=f"No chunk index for file_id: {file_id}")
+    if not acknowledged:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Revision {request.revision} is not the pending revision of {file_id}"
+        )
+    return {"file_id": file_id, "revision": request.revision, "acknowledged": True}
+
+
+@app.delete("/chunk/index/{file_id}")
+async def forget_chunk_index(file_id: str):
+    """
+    Forget the chunk ids stored for a file_id by diff runs
+
+    The next diff for the file_id then reports every chunk as added. Call it
+    when the document is deleted from the vector store.
+    """
+    if not await run_in_threadpool(chunk_index.forget, file_id):
+        raise HTTPException(status_code=404, detail=f"No chunk index for file_id: {file_id}")
+    return {"file_id": file_id, "deleted": True}
+
+
+async def parse_batch_request(request: Request):
+    """
+    Read a /chunk/batch body into items and their uploaded files
+
+    JSON bodies carry {"items": [...]} with URL items only. Multipart bodies
+    carry the uploads as repeated "files" parts plus an optional "items" form
+    field (JSON list) whose "upload" entries reference the files by name;
+    without it every upload is chunked with default settings.
+
+    Returns:
+        Tuple of (items, {filename: SourceFile}) - caller cleans up the sources
+    """
+    content_type = request.headers.get("content-type", "")
+    uploads = {}
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            for file in form.getlist("files"):
+                if not hasattr(file, "read"):
+                    continue
+                # Items reference uploads by name, so names must be unique
+                if file.filename in uploads:
+                    raise HTTPException(status_code=400, detail=f"Duplicate upload name: {file.filename}")
+                uploads[file.filename] = await save_upload(file)
+            raw_items = form.get("items")
+            if raw_items:
+                batch = BatchChunkRequest(items=json.loads(raw_items))
+            else:
+                batch = BatchChunkRequest(items=[{"upload": name} for name in uploads])
+        else:
+            batch = BatchChunkRequest.model_validate(await request.json())
+    except HTTPException:
+        for source in uploads.values():
+            source.cleanup()
+        raise
+    except ValidationError as e:
+        for source in uploads.values():
+            source.cleanup()
+        raise RequestValidationError(e.errors())
+    except ValueError as e:
+        for source in uploads.values():
+            source.cleanup()
+        raise HTTPException(status_code=400, detail=f"Invalid batch request: {str(e)}")
+
+    problems = []
+    if not batch.items:
+        problems.append("Batch has no items")
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        problems.append(f"Batch has {len(batch.items)} items, limit is {BATCH_MAX_ITEMS}")
+    missing = [item.upload for item in batch.items if item.upload and item.upload not in uploads]
+    if missing:
+        problems.append(f"Items reference missing uploads: {', '.join(missing)}")
+    if problems:
+        for source in uploads.values():
+            source.cleanup()
+        raise HTTPException(status_code=400, detail="; ".join(problems))
+
+    return batch.items, uploads
+
+
+@app.post("/chunk/batch")
+async def chunk_batch(request: Request):
+    """
+    Chunk many documents in one request, streaming results as they finish
+
+    Accepts either a JSON body {"items": [ChunkRequest-shaped items]} or a
+    multipart upload (see parse_batch_request). Documents are converted
+    concurrently across the worker pool and every finished document is
+    written as one NDJSON line carrying its item "index" and "file_id" plus
+    the usual ChunkResponse fields; a failing document only fails its own
+    line. The last line is a summary with succeeded/failed counts.
+    
+    Returns:
+        StreamingResponse of application/x-ndjson lines
+    """
+    items, uploads = await parse_batch_request(request)
+    logger.info(f"Chunking batch of {len(items)} documents")
+
+    # Leave room in the pool's backlog for other requests, and let the next
+    # few downloads run while the current documents are being converted
+    slots = asyncio.Semaphore(max(1, pool.max_workers))
+    ahead = asyncio.Semaphore(max(1, pool.max_workers) + BATCH_PREFETCH)
+
+    async def run_item(index: int, item: BatchChunkItem) -> dict:
+        metrics.start_timings()
+        # Batches queue behind single requests unless an item asks otherwise
+        workers.set_priority(workers.BULK, requested=False)
+        # Uploads may be shared by several items; stream_results cleans them up
+        downloaded = None
+        try:
+            async with ahead:
+                if item.upload:
+                    source = uploads[item.upload]
+                else:
+                    source = downloaded = await fetch_source(str(item.url))
+                async with slots:
+                    response = await chunk_source(source, item)
+        except HTTPException as e:
+            response = ChunkResponse(success=False, error=str(e.detail))
+        except Exception as e:
+            logger.error(f"Error chunking batch item {index}: {str(e)}")
+            response = ChunkResponse(success=False, error=str(e))
+        finally:
+            if downloaded:
+                downloaded.cleanup()
+        return {"index": index, "file_id": item.file_id, **response.model_dump()}
+
+    async def stream_results():
+        tasks = [asyncio.create_task(run_item(i, item)) for i, item in enumerate(items)]
+        succeeded = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                succeeded += 1 if result["success"] else 0
+                yield encoding.json_line(result)
+            yield encoding.json_line({
+                "done": True,
+                "total": len(items),
+                "succeeded": succeeded,
+                "failed": len(items) - succeeded
+            })
+        finally:
+            # Client went away: stop work that nobody will read
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for source in uploads.values():
+                source.cleanup()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+def job_payload(request: BaseModel) -> dict:
+    """Stored job request, with the submitter's scheduling class"""
+    payload = request.model_dump(mode="json", exclude={"webhook_url"})
+    task_class = workers.current_task_class()
+    payload["client"] = task_class.client
+    if task_class.origin == "api_key":
+        payload["priority"] = task_class.priority
+    return payload
+
+
+def classify_job(payload: dict):
+    """Jobs run as bulk work of the client that submitted them"""
+    workers.classify_client(payload.get("client", "jobs"))
+    workers.set_priority(workers.BULK, requested=False)
+
+
+@app.post("/jobs/convert", response_model=JobResponse, status_code=202)
+async def submit_convert_job(request: JobConvertRequest):
+    """
+    Queue a URL conversion and return immediately
+
+    Args:
+        request: URLConvertRequest fields plus an optional webhook_url
+
+    Returns:
+        JobResponse to poll at /jobs/{job_id}
+    """
+    check_output_format(request.output_format)
+    check_profile(request)
+    payload = job_payload(request)
+    job = await job_manager.submit(
+        "convert",
+        payload,
+        str(request.webhook_url) if request.webhook_url else None
+    )
+    logger.info(f"Queued convert job {job['id']} for {request.url}")
+    return public_view(job)
+
+
+@app.post("/jobs/chunk", response_model=JobResponse, status_code=202)
+async def submit_chunk_job(request: JobChunkRequest):
+    """
+    Queue a chunking request and return immediately
+
+    Args:
+        request: ChunkRequest fields plus an optional webhook_url
+
+    Returns:
+        JobResponse to poll at /jobs/{job_id}
+    """
+    chunk_settings(request)
+    check_profile(request)
+    payload = job_payload(request)
+    job = await job_manager.submit(
+        "chunk",
+        payload,
+        str(request.webhook_url) if request.webhook_url else None
+    )
+    logger.info(f"Queued chunk job {job['id']} for {request.url}")
+    return public_view(job)
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """
+    Get the status of a job, including its result once finished
+
+    Args:
+        job_id: Identifier returned when the job was submitted
+
+    Returns:
+        JobResponse with status queued, running, succeeded or failed
+    """
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return public_view(job)
+
+
+async def run_convert_job(payload: dict) -> dict:
+    classify_job(payload)
+    response = await convert_url(URLConvertRequest(**payload))
+    return response.model_dump()
+
+
+async def run_chunk_job(payload: dict) -> dict:
+    classify_job(payload)
+    response = await chunk_from_url(ChunkRequest(**payload))
+    return response.model_dump()
+
+
+job_manager.register("convert", run_convert_job)
+job_manager.register("chunk", run_chunk_job)
+
+# Docling, transformers and torch are imported lazily, by the warm-up or the
+# first request that needs them, so this is mostly FastAPI and pydantic
+_imported = metrics.process_age()
+startup_timings["imported"] = round(_imported, 3) if _imported is not None else None
 
 
 if __name__ == "__main__":
@@ -0,0 +1,249 @@
+"""
+Prometheus metrics and per-request stage timings
+
+Request counts and latencies are recorded by a middleware in main.py; the
+pipeline stages (download, cache lookup, conversion, export, chunking, token
+counting) are timed with ``stage()``, which both observes the stage histogram
+and adds the duration to the current request's timings dict returned in
+response ``metadata.timings``. Values that only exist as live state (queue
+depths, cache counters, memory) are read when /metrics is scraped.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR so counters and histograms are
+aggregated over all workers; live values then describe the worker answering
+the scrape.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+import time
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+REQUESTS = Counter(
+    "docling_requests_total", "HTTP requests by endpoint, method and status",
+    ["endpoint", "method", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "docling_request_duration_seconds", "HTTP request latency by endpoint",
+    ["endpoint"], buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "docling_stage_duration_seconds", "Time spent per pipeline stage",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+CONVERSIONS_IN_FLIGHT = Gauge(
+    "docling_conversions_in_flight", "Documents currently being converted",
+    multiprocess_mode="livesum"
+)
+COALESCED = Counter(
+    "docling_conversions_coalesced_total",
+    "Requests that joined an identical conversion already running instead of starting one"
+)
+SCHEDULER_WAIT = Histogram(
+    "docling_scheduler_wait_seconds", "Time tasks waited for a worker, by pool and priority",
+    ["pool", "priority"], buckets=LATENCY_BUCKETS
+)
+WORKER_RECYCLES = Counter(
+    "docling_worker_recycles_total", "Worker process pools replaced, by pool and reason",
+    ["pool", "reason"]
+)
+MEMORY_REJECTED = Counter(
+    "docling_memory_rejections_total", "Conversions refused because memory was too low"
+)
+PAGES_CONVERTED = Counter("docling_pages_converted_total", "Pages converted by Docling")
+PAGES_PER_SECOND = Histogram(
+    "docling_conversion_pages_per_second", "Conversion throughput per document",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, 100)
+)
+
+_timings: ContextVar[Optional[dict]] = ContextVar("docling_timings", default=None)
+
+
+def start_timings() -> dict:
+    """Start collecting stage timings for the current request (or batch item)"""
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+
+def current_timings() -> Optional[dict]:
+    """Timings dict of the current request, if one was started"""
+    return _timings.get()
+
+
+def record(name: str, seconds: float):
+    """Add a measured duration to the stage histogram and the current timings"""
+    STAGE_LATENCY.labels(name).observe(seconds)
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = round(timings.get(name, 0) + seconds, 4)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as one pipeline stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def add_details(name: str, details: dict):
+    """Attach a nested breakdown (e.g. Docling's own timings) to the current timings"""
+    timings = _timings.get()
+    if timings is not None and details:
+        timings[name] = details
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    return int(value) if value.isdigit() else None
+
+
+def _read_stat(path: str, key: str) -> Optional[int]:
+    """Value of one "key value" line of a cgroup memory.stat file"""
+    try:
+        with open(path) as f:
+            for line in f:
+                name, _, value = line.partition(" ")
+                if name == key:
+                    return int(value)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_memory_bytes() -> Optional[int]:
+    """
+    Memory that can still be allocated: the container's headroom under its
+    cgroup limit, or MemAvailable when that is lower or there is no limit
+
+    The cgroup's usage includes its page cache; inactive file pages are
+    reclaimed before the limit is hit, so they count as available.
+    """
+    available = None
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    available = int(line.split()[1]) * 1024
+                    break
+    except (OSError, ValueError, IndexError):
+        pass
+    for limit_path, usage_path, stat_path, inactive_key in (
+        ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current",
+         "/sys/fs/cgroup/memory.stat", "inactive_file"),
+        ("/sys/fs/cgroup/memory/memory.limit_in_bytes", "/sys/fs/cgroup/memory/memory.usage_in_bytes",
+         "/sys/fs/cgroup/memory/memory.stat", "total_inactive_file"),
+    ):
+        limit = _read_int(limit_path)
+        usage = _read_int(usage_path)
+        if limit is not None and usage is not None and limit < 1 << 60:
+            inactive = _read_stat(stat_path, inactive_key) or 0
+            headroom = max(0, limit - max(0, usage - inactive))
+            available = headroom if available is None else min(available, headroom)
+            break
+    return available
+
+
+def process_age() -> Optional[float]:
+    """Seconds since this process started"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22, after the parenthesised command name: start time in clock ticks since boot
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class LiveCollector:
+    """Gauges read from live objects at scrape time"""
+
+    def __init__(self):
+        self._gauges: List[Tuple[str, str, Callable[[], Dict[Tuple[str, ...], float]], List[str]]] = []
+
+    def add(self, name: str, documentation: str, read: Callable[[], Dict[Tuple[str, ...], float]],
+            labels: Optional[List[str]] = None):
+        """
+        Register a gauge
+
+        Args:
+            name: Metric name
+            documentation: Help text
+            read: Callable returning {label values tuple: value}
+            labels: Label names (empty for a single unlabelled value)
+        """
+        self._gauges.append((name, documentation, read, labels or []))
+
+    def collect(self):
+        for name, documentation, read, labels in self._gauges:
+            family = GaugeMetricFamily(name, documentation, labels=labels)
+            try:
+                values = read()
+            except Exception:
+                continue
+            for label_values, value in values.items():
+                if value is not None:
+                    family.add_metric(list(label_values), value)
+            yield family
+
+
+live = LiveCollector()
+live.add(
+    "docling_worker_resident_memory_bytes", "Resident memory of the process answering the scrape",
+    lambda: {(): rss_bytes()}
+)
+live.add(
+    "docling_available_memory_bytes", "Memory still available to the container",
+    lambda: {(): available_memory_bytes()}
+)
+
+if MULTIPROC_DIR:
+    from prometheus_client import multiprocess
+
+    def _registry() -> CollectorRegistry:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(live)
+        return registry
+else:
+    REGISTRY.register(live)
+
+    def _registry() -> CollectorRegistry:
+        return REGISTRY
+
+
+def render() -> Tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with their content type"""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
@@ -0,0 +1,578 @@
+"""
+Blocking Docling work (conversion, export, chunking) run inside the worker pool
+
+Everything here is synchronous and CPU bound; the FastAPI endpoints in main.py
+never call these functions directly but dispatch them through workers.pool.
+Functions only take and return picklable values so they also work when the
+pool runs in process mode.
+
+Docling, docling-core and pypdfium2 are imported inside the functions that
+use them, so importing this module does not load them.
+"""
+from dataclasses import dataclass
+from io import BytesIO
+from typing import TYPE_CHECKING, Dict, FrozenSet, Iterator, Optional, List, Tuple
+import hashlib
+import logging
+import time
+import os
+
+if TYPE_CHECKING:
+    from docling_core.types.doc import DoclingDocument
+
+import converters
+from chunkers import registry
+from embeddings import embedding_models, encode_vector
+from sources import SourceFile
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ("markdown", "json", "html", "doctags")
+
+# Opt-in chunk metadata, read from each chunk's doc items while chunking
+CHUNK_METADATA_FIELDS = ("headings", "pages", "bboxes", "labels", "contextualized")
+
+# Chunks per batched tokenizer call when streaming
+TOKEN_BATCH_SIZE = 32
+
+# Page-sharded conversion of large PDFs: pages per shard, and the page count
+# from which documents are sharded without an explicit parallel_pages=true
+SHARD_PAGES = int(os.environ.get("DOCLING_SHARD_PAGES", 50))
+SHARD_MIN_PAGES = int(os.environ.get("DOCLING_SHARD_MIN_PAGES", 200))
+
+# Ask Docling for its per-step timings (layout, OCR, tables...), reported in
+# the response timings next to the service's own stages
+PIPELINE_TIMINGS = os.environ.get("DOCLING_PIPELINE_TIMINGS", "false").lower() in ("1", "true", "yes")
+
+# Markdown, plain text and HTML up to this size are converted next to the
+# worker pool (they need no models) instead of queueing behind PDFs
+LIGHT_MAX_BYTES = int(os.environ.get("DOCLING_LIGHT_MAX_KB", 2048)) * 1024
+
+# Extensions of the formats served by the light converter
+LIGHT_EXTENSIONS = {
+    ".md": "md", ".markdown": "md",
+    ".txt": "txt", ".text": "txt",
+    ".html": "html", ".htm": "html", ".xhtml": "html",
+}
+
+# Text layer detection for the "auto" profile: pages sampled and the average
+# characters per sampled page above which a PDF counts as born-digital
+TEXT_LAYER_SAMPLE_PAGES = int(os.environ.get("DOCLING_TEXT_LAYER_SAMPLE_PAGES", 3))
+TEXT_LAYER_MIN_CHARS = int(os.environ.get("DOCLING_TEXT_LAYER_MIN_CHARS", 100))
+
+
+@dataclass(frozen=True)
+class ChunkSettings:
+    """Chunking options of one request"""
+    max_tokens: int = 512
+    merge_peers: bool = True
+    tokenizer: Optional[str] = None
+    file_id: Optional[str] = None
+    count_tokens: bool = True
+    # Embed every chunk with the tokenizer's model (see embeddings.py)
+    embed: bool = False
+    contextualize: bool = False
+    embedding_format: str = "base64"
+    # Extra metadata fields per chunk (CHUNK_METADATA_FIELDS)
+    include_metadata: Tuple[str, ...] = ()
+
+
+def docling_input(source: SourceFile):
+    """
+    In-memory sources become a DocumentStream, stored ones are passed by path
+
+    Plain text has no Docling backend; it is handed over as Markdown.
+    """
+    from docling.datamodel.base_models import DocumentStream
+
+    if sniff_format(source) == "txt":
+        data = source.data
+        if data is None:
+            with open(source.path, "rb") as f:
+                data = f.read()
+        name = os.path.splitext(source.name)[0] + ".md"
+        return DocumentStream(name=name, stream=BytesIO(data))
+    if source.data is not None:
+        return DocumentStream(name=source.name, stream=BytesIO(source.data))
+    return source.path
+
+
+def _head(source: SourceFile, size: int = 512) -> bytes:
+    if source.data is not None:
+        return source.data[:size]
+    with open(source.path, "rb") as f:
+        return f.read(size)
+
+
+def sniff_format(source: SourceFile) -> str:
+    """
+    Classify a source from its magic bytes and name
+
+    Returns:
+        "pdf", "md", "txt", "html", or "other" for everything left to Docling's detection
+    """
+    head = _head(source)
+    if head.startswith(b"%PDF-"):
+        return "pdf"
+    extension = os.path.splitext(source.name)[1].lower()
+    if extension in LIGHT_EXTENSIONS:
+        return LIGHT_EXTENSIONS[extension]
+    if head.lstrip().lower().startswith((b"<!doctype html", b"<html")):
+        return "html"
+    return "other"
+
+
+def is_pdf(source: SourceFile) -> bool:
+    """Whether the source starts with the PDF magic bytes"""
+    return _head(source, 5) == b"%PDF-"
+
+
+def is_light(source: SourceFile) -> bool:
+    """Whether the source is served by the model-free light converter"""
+    return sniff_format(source) in ("md", "txt", "html")
+
+
+def _open_pdf(source: SourceFile):
+    import pypdfium2 as pdfium
+
+    return pdfium.PdfDocument(source.data if source.data is not None else source.path)
+
+
+def count_pages(source: SourceFile) -> Optional[int]:
+    """
+    Count the pages of a PDF without converting it
+
+    Returns:
+        Number of pages, or None if the source is not a PDF
+    """
+    if not is_pdf(source):
+        return None
+    pdf = _open_pdf(source)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def has_text_layer(source: SourceFile) -> bool:
+    """
+    Whether a PDF carries extractable text, judged from a few evenly spaced pages
+
+    Returns:
+        True if the sampled pages average at least TEXT_LAYER_MIN_CHARS characters
+    """
+    pdf = _open_pdf(source)
+    try:
+        page_count = len(pdf)
+        if page_count == 0:
+            return False
+        samples = min(TEXT_LAYER_SAMPLE_PAGES, page_count)
+        indexes = sorted({i * page_count // samples for i in range(samples)})
+        chars = 0
+        for index in indexes:
+            page = pdf[index]
+            textpage = page.get_textpage()
+            try:
+                chars += textpage.count_chars()
+            finally:
+                textpage.close()
+                page.close()
+        return chars / len(indexes) >= TEXT_LAYER_MIN_CHARS
+    finally:
+        pdf.close()
+
+
+def pick_profile(source: SourceFile, profile: Optional[str] = None) -> str:
+    """
+    Resolve a requested pipeline profile to a concrete one
+
+    Markdown, text and HTML always get the model-free light converter.
+    Otherwise "auto" picks the cheap profile for PDFs with a text layer and
+    the OCR profile for scanned ones; the profiles only differ for PDFs, so
+    other formats always get the cheap one.
+
+    Raises:
+        converters.UnknownProfileError: If the profile is not configured
+    """
+    profile = converters.registry.resolve(profile)
+    if is_light(source):
+        return converters.LIGHT
+    if profile != converters.AUTO:
+        return profile
+    if not is_pdf(source) or has_text_layer(source):
+        return converters.AUTO_TEXT_PROFILE
+    return converters.AUTO_SCANNED_PROFILE
+
+
+def plan_shards(
+    page_count: int,
+    page_range: Optional[Tuple[int, int]] = None,
+    shard_pages: int = SHARD_PAGES
+) -> List[Tuple[int, int]]:
+    """
+    Split the pages to convert into consecutive windows of ``shard_pages``
+
+    Args:
+        page_count: Number of pages in the document
+        page_range: Optional 1-based inclusive (first, last) page to limit to
+        shard_pages: Pages per window
+
+    Returns:
+        1-based inclusive page ranges, in document order
+    """
+    first, last = page_range or (1, page_count)
+    last = min(last, page_count)
+    return [
+        (start, min(start + shard_pages - 1, last))
+        for start in range(first, last + 1, max(1, shard_pages))
+    ]
+
+
+def convert_source(
+    source: SourceFile,
+    page_range: Optional[Tuple[int, int]] = None,
+    profile: Optional[str] = None
+):
+    """
+    Run the Docling pipeline on a source
+
+    Args:
+        source: Local copy of the document
+        page_range: Optional 1-based inclusive (first, last) pages to convert
+        profile: Pipeline profile (see converters.PROFILES), converters.LIGHT, "auto" or None for the default
+
+    Returns:
+        Tuple of (converted DoclingDocument, Docling's step timings in seconds -
+        empty unless DOCLING_PIPELINE_TIMINGS is enabled)
+    """
+    if PIPELINE_TIMINGS:
+        from docling.datamodel.settings import settings as docling_settings
+
+        docling_settings.debug.profile_pipeline_timings = True
+    if profile != converters.LIGHT:
+        profile = pick_profile(source, profile)
+    converter = converters.registry.get(profile)
+    options = {"page_range": tuple(page_range)} if page_range else {}
+    result = converter.convert(docling_input(source), **options)
+    timings = {
+        scope: round(sum(item.times), 4)
+        for scope, item in (getattr(result, "timings", None) or {}).items()
+    }
+    return result.document, timings
+
+
+def _shift_pages(doc: "DoclingDocument", offset: int):
+    """Add ``offset`` to every page number of a document, in place"""
+    from docling_core.types.doc import ContentLayer
+
+    for item, _ in doc.iterate_items(
+        with_groups=True, traverse_pictures=True, included_content_layers=set(ContentLayer)
+    ):
+        for prov in getattr(item, "prov", None) or []:
+            prov.page_no += offset
+    doc.pages = {
+        page_no + offset: page.model_copy(update={"page_no": page_no + offset})
+        for page_no, page in doc.pages.items()
+    }
+
+
+def merge_documents(docs: List["DoclingDocument"], first_page: int = 1) -> "DoclingDocument":
+    """
+    Stitch documents converted from consecutive page shards back together
+
+    ``DoclingDocument.concatenate`` numbers the merged pages from 1, so they
+    are shifted back to start at ``first_page`` and match an unsharded
+    conversion of the same page range.
+
+    Args:
+        docs: Shard documents in page order
+        first_page: Original number of the first page of the first shard
+
+    Returns:
+        One DoclingDocument covering all shards
+    """
+    if len(docs) == 1:
+        return docs[0]
+    from docling_core.types.doc import DoclingDocument
+
+    merged = DoclingDocument.concatenate(docs)
+    if first_page > 1 and merged.pages and min(merged.pages) != first_page:
+        _shift_pages(merged, first_page - min(merged.pages))
+    return merged
+
+
+def export_document(doc, output_format: str):
+    """
+    Export a DoclingDocument to one of SUPPORTED_FORMATS
+
+    Args:
+        doc: DoclingDocument to export
+        output_format: markdown, json, html or doctags
+
+    Returns:
+        Exported content (dict for json, str otherwise)
+    """
+    output_format = output_format.lower()
+    if output_format == "markdown":
+        return doc.export_to_markdown()
+    elif output_format == "json":
+        return doc.export_to_dict()
+    elif output_format == "html":
+        return doc.export_to_html()
+    elif output_format == "doctags":
+        return doc.export_to_doctags()
+    raise ValueError(f"Unsupported output format: {output_format}")
+
+
+def export_formats(doc, output_formats: List[str]) -> Dict[str, object]:
+    """
+    Export one DoclingDocument to several formats
+
+    Only the requested formats are exported, each once.
+
+    Returns:
+        {format: exported content} in request order
+    """
+    exports = {}
+    for output_format in output_formats:
+        output_format = output_format.lower()
+        if output_format not in exports:
+            exports[output_format] = export_document(doc, output_format)
+    return exports
+
+
+def tokenize(texts: List[str], tokenizer: Optional[str] = None) -> List[List[int]]:
+    """
+    Token ids of many texts in one batched fast-tokenizer call
+
+    Ids include special tokens, matching ``tokenizer.encode(text)``.
+    """
+    if not texts:
+        return []
+    encoded = registry.get_tokenizer(tokenizer)(
+        texts,
+        add_special_tokens=True,
+        return_attention_mask=False,
+        return_token_type_ids=False
+    )
+    return encoded["input_ids"]
+
+
+def count_tokens(texts: List[str], tokenizer: Optional[str] = None) -> List[int]:
+    """Count tokens of many texts in one batched fast-tokenizer call (special tokens included)"""
+    return [len(ids) for ids in tokenize(texts, tokenizer)]
+
+
+def chunk_id(text: str, file_id: Optional[str], occurrence: int = 0) -> str:
+    """
+    Stable id of a chunk, derived from its document and content
+
+    The id does not depend on the chunk's position, so a passage keeps its id
+    when the text before it changes. ``occurrence`` tells repeated identical
+    chunks of one document apart (0 for the first).
+    """
+    digest = hashlib.sha256(f"{file_id or ''}\0{occurrence}\0{text}".encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def _chunk_ids(texts: List[str], file_id: Optional[str], seen: Dict[str, int]) -> List[str]:
+    ids = []
+    for text in texts:
+        occurrence = seen.get(text, 0)
+        seen[text] = occurrence + 1
+        ids.append(chunk_id(text, file_id, occurrence))
+    return ids
+
+
+def _embed_chunks(chunks: List[dict], embed_texts: List[str], settings: ChunkSettings,
+                  skip_ids: FrozenSet[str], input_ids: Optional[List[List[int]]] = None):
+    """Add an "embedding" to every chunk whose id is not in skip_ids (input_ids: of embed_texts, if known)"""
+    pending = [i for i, chunk in enumerate(chunks) if chunk["chunk_id"] not in skip_ids]
+    vectors = embedding_models.embed(
+        [embed_texts[i] for i in pending], settings.tokenizer,
+        input_ids=[input_ids[i] for i in pending] if input_ids is not None else None
+    )
+    for i, vector in zip(pending, vectors):
+        chunks[i]["embedding"] = encode_vector(vector, settings.embedding_format)
+
+
+def _format_chunks(texts: List[str], first_index: int, settings: ChunkSettings,
+                   seen: Dict[str, int], embed_texts: Optional[List[str]] = None,
+                   skip_ids: FrozenSet[str] = frozenset(),
+                   timings: Optional[Dict[str, float]] = None,
+                   extra_metadata: Optional[List[dict]] = None) -> List[dict]:
+    started = time.perf_counter()
+    input_ids = None
+    if settings.count_tokens:
+        input_ids = tokenize(texts, settings.tokenizer)
+        token_counts = [len(ids) for ids in input_ids]
+    else:
+        token_counts = [None] * len(texts)
+    counted = time.perf_counter()
+
+    chunk_ids = _chunk_ids(texts, settings.file_id, seen)
+
+    # file_id on every chunk, plus the include_metadata fields read while chunking
+    chunk_metadata = {}
+    if settings.file_id:
+        chunk_metadata['file_id'] = settings.file_id
+
+    chunks = [
+        {
+            "content": text,
+            "chunk": first_index + offset,
+            "chunk_id": chunk_ids[offset],
+            "chunk_size": len(text),
+            "tokens": tokens,
+            "metadata": {**chunk_metadata, **extra_metadata[offset]} if extra_metadata else dict(chunk_metadata)
+        }
+        for offset, (text, tokens) in enumerate(zip(texts, token_counts))
+    ]
+    if settings.embed:
+        # Uncontextualized chunks embed the texts just counted: reuse their ids
+        if embed_texts and embed_texts != texts:
+            input_ids = None
+        _embed_chunks(chunks, embed_texts or texts, settings, skip_ids, input_ids)
+    if timings is not None:
+        timings["tokens"] = timings.get("tokens", 0) + counted - started
+        if settings.embed:
+            timings["embed"] = timings.get("embed", 0) + time.perf_counter() - counted
+    return chunks
+
+
+def _get_chunker(settings: ChunkSettings):
+    return registry.get_chunker(settings.tokenizer, settings.max_tokens, settings.merge_peers)
+
+
+def _bboxes(doc_items, doc: "DoclingDocument") -> List[list]:
+    """[page, left, top, right, bottom] per provenance, top-left origin, in points"""
+    boxes = []
+    for item in doc_items:
+        for prov in item.prov:
+            bbox = prov.bbox
+            page = doc.pages.get(prov.page_no)
+            if page is not None:
+                bbox = bbox.to_top_left_origin(page_height=page.size.height)
+            box = [prov.page_no, *(round(value, 1) for value in bbox.as_tuple())]
+            if box not in boxes:
+                boxes.append(box)
+    return boxes
+
+
+def _chunk_metadata(chunk, doc: "DoclingDocument", fields: Tuple[str, ...],
+                    contextualized: Optional[str]) -> dict:
+    """Requested metadata fields of one chunk, from the doc items the chunker attached"""
+    doc_items = chunk.meta.doc_items
+    metadata = {}
+    if "headings" in fields:
+        metadata["headings"] = list(chunk.meta.headings or [])
+    if "pages" in fields:
+        metadata["pages"] = sorted({prov.page_no for item in doc_items for prov in item.prov})
+    if "bboxes" in fields:
+        metadata["bboxes"] = _bboxes(doc_items, doc)
+    if "labels" in fields:
+        metadata["labels"] = list(dict.fromkeys(str(item.label.value) for item in doc_items))
+    if "contextualized" in fields:
+        metadata["contextualized"] = contextualized
+    return metadata
+
+
+def _read_chunk(chunker, chunk, doc: "DoclingDocument", settings: ChunkSettings
+                ) -> Tuple[str, Optional[dict]]:
+    """
+    Text to embed and extra metadata of a chunk, in the pass that produced it
+
+    The contextualized text (headings prepended) is computed at most once,
+    whether it is embedded, returned, or both.
+    """
+    contextualize = settings.embed and settings.contextualize
+    contextualized = None
+    if contextualize or "contextualized" in settings.include_metadata:
+        contextualized = chunker.contextualize(chunk=chunk)
+    metadata = None
+    if settings.include_metadata:
+        metadata = _chunk_metadata(chunk, doc, settings.include_metadata, contextualized)
+    return (contextualized if contextualize else chunk.text), metadata
+
+
+def iter_chunk_batches(doc, settings: ChunkSettings, batch_size: int = TOKEN_BATCH_SIZE,
+                       skip_ids: FrozenSet[str] = frozenset()) -> Iterator[List[dict]]:
+    """
+    Chunk a DoclingDocument with HybridChunker, yielding groups of chunks as they are produced
+
+    Token counts (and embeddings) are computed per group of ``batch_size``
+    chunks so the models run batched while the first chunks still go out
+    early. The caller advances the generator with next_chunk_batch() in the
+    worker pool, one task per group.
+
+    Args:
+        doc: DoclingDocument to chunk
+        settings: Chunking options
+        batch_size: Chunks per batched token count
+        skip_ids: Chunk ids that are not embedded (already known to the caller)
+
+    Yields:
+        Lists of chunk dicts in PGVector layout
+    """
+    chunker = _get_chunker(settings)
+
+    texts = []
+    embed_texts = []
+    extra_metadata = []
+    first_index = 0
+    seen = {}
+    for chunk in chunker.chunk(dl_doc=doc):
+        embed_text, metadata = _read_chunk(chunker, chunk, doc, settings)
+        texts.append(chunk.text)
+        embed_texts.append(embed_text)
+        extra_metadata.append(metadata)
+        if len(texts) >= batch_size:
+            yield _format_chunks(texts, first_index, settings, seen, embed_texts, skip_ids,
+                                 extra_metadata=extra_metadata if settings.include_metadata else None)
+            first_index += len(texts)
+            texts = []
+            embed_texts = []
+            extra_metadata = []
+    if texts:
+        yield _format_chunks(texts, first_index, settings, seen, embed_texts, skip_ids,
+                             extra_metadata=extra_metadata if settings.include_metadata else None)
+
+
+def next_chunk_batch(batches: Iterator[List[dict]]) -> Optional[List[dict]]:
+    """Produce the next group of an iter_chunk_batches() generator (None when done)"""
+    return next(batches, None)
+
+
+def chunk_document(doc, settings: ChunkSettings, skip_ids: FrozenSet[str] = frozenset()
+                   ) -> Tuple[List[dict], Optional[int], Dict[str, float]]:
+    """
+    Chunk a DoclingDocument with HybridChunker
+
+    Args:
+        doc: DoclingDocument to chunk
+        settings: Chunking options (token counts and embeddings use one
+            batched pass over all chunks)
+        skip_ids: Chunk ids that are not embedded (already known to the caller)
+
+    Returns:
+        Tuple of (chunk dicts in PGVector layout, total token count or None,
+        seconds spent in the "chunk", "tokens" and "embed" stages)
+    """
+    started = time.perf_counter()
+    chunker = _get_chunker(settings)
+    texts = []
+    embed_texts = []
+    extra_metadata = []
+    for chunk in chunker.chunk(dl_doc=doc):
+        embed_text, metadata = _read_chunk(chunker, chunk, doc, settings)
+        texts.append(chunk.text)
+        embed_texts.append(embed_text)
+        extra_metadata.append(metadata)
+    timings = {"chunk": time.perf_counter() - started}
+    formatted_chunks = _format_chunks(
+        texts, 0, settings, {}, embed_texts, skip_ids, timings,
+        extra_metadata=extra_metadata if settings.include_metadata else None
+    )
+    if not settings.count_tokens:
+        return formatted_chunks, None, timings
+    return formatted_chunks, sum(chunk["tokens"] for chunk in formatted_chunks), timings
@@ -0,0 +1,63 @@
+"""
+Single-flight execution of identical concurrent conversions
+
+Requests for the same document with the same conversion options (the
+conversion cache key) that arrive while a conversion of it is running wait
+for that conversion instead of starting their own. The shared work runs as a
+task of its own, so a caller that disconnects does not cancel it for the
+others. Coalescing is per process: gunicorn workers each run their own.
+"""
+from typing import Awaitable, Callable, Dict, Tuple, TypeVar
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls by key"""
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Nobody may be left waiting; do not log "exception never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Run ``fn()`` unless a call with the same key is already running
+
+        Args:
+            key: Identity of the work (e.g. the conversion cache key)
+            fn: Coroutine function doing the work; it runs in a separate task
+                that inherits the first caller's context
+
+        Returns:
+            Tuple of (result, True if this call joined a running one)
+
+        Raises:
+            Whatever the shared call raised, in every caller
+        """
+        task = self._tasks.get(key)
+        joined = task is not None
+        if joined:
+            self.coalesced += 1
+            logger.info(f"Joining in-flight conversion {key[:12]}")
+        else:
+            self.started += 1
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        return await asyncio.shield(task), joined
@@ -0,0 +1,426 @@
+"""
+Source acquisition: materialise URLs and uploads as local files with content hashes
+"""
+from dataclasses import dataclass, replace
+from typing import AsyncIterator, Optional
+from email.message import Message
+from urllib.parse import urlparse, unquote
+import asyncio
+import hashlib
+import mimetypes
+import tempfile
+import shutil
+import logging
+import json
+import os
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 1024 * 1024
+
+# Uploads larger than this are rejected with 413
+MAX_UPLOAD_MB = int(os.environ.get("DOCLING_MAX_UPLOAD_MB", 200))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+
+# Documents up to this size stay in memory and skip the temp-file round trip
+IN_MEMORY_MAX_BYTES = int(os.environ.get("DOCLING_IN_MEMORY_MAX_KB", 1024)) * 1024
+
+# URL downloads
+MAX_DOWNLOAD_MB = int(os.environ.get("DOCLING_MAX_DOWNLOAD_MB", MAX_UPLOAD_MB))
+FETCH_TIMEOUT = float(os.environ.get("DOCLING_FETCH_TIMEOUT", 300))
+FETCH_CONNECT_TIMEOUT = float(os.environ.get("DOCLING_FETCH_CONNECT_TIMEOUT", 10))
+FETCH_MAX_CONNECTIONS = int(os.environ.get("DOCLING_FETCH_MAX_CONNECTIONS", 20))
+DOWNLOAD_CACHE_DIR = os.environ.get(
+    "DOCLING_DOWNLOAD_CACHE_DIR", os.path.join(tempfile.gettempdir(), "docling-downloads")
+)
+DOWNLOAD_CACHE_MB = int(os.environ.get("DOCLING_DOWNLOAD_CACHE_MB", 1024))
+
+
+class SourceTooLargeError(ValueError):
+    """Raised when a document exceeds the configured size limit"""
+
+
+@dataclass
+class SourceFile:
+    """
+    A document with its content hash, either kept in memory (``data``) or
+    stored in its own temporary directory under its original name (``path``)
+    """
+    name: str
+    path: Optional[str]
+    sha256: str
+    size: int
+    data: Optional[bytes] = None
+
+    def cleanup(self):
+        """Remove the temporary directory holding the document (safe to repeat)"""
+        if self.path is None:
+            return
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            return
+        try:
+            shutil.rmtree(directory)
+        except Exception as e:
+            logger.warning(f"Failed to delete temporary file: {str(e)}")
+
+    def clone(self) -> "SourceFile":
+        """
+        A SourceFile for the same document whose cleanup is independent of this one
+
+        In-memory sources are returned as is (their cleanup does nothing);
+        stored ones get a hard link (a copy across file systems) in a new
+        temporary directory.
+        """
+        if self.path is None:
+            return self
+        path = _new_path(os.path.basename(self.path))
+        _link_or_copy(self.path, path)
+        return replace(self, path=path)
+
+
+def _safe_name(name: str, default: str = "document") -> str:
+    name = os.path.basename(unquote(name or "")).strip()
+    return name or default
+
+
+def _filename_from_response(url: str, headers) -> str:
+    """Pick a file name that keeps the extension Docling uses for format detection"""
+    disposition = headers.get("Content-Disposition")
+    name = None
+    if disposition:
+        message = Message()
+        message["Content-Disposition"] = disposition
+        name = message.get_filename()
+    if not name:
+        name = urlparse(url).path
+    name = _safe_name(name)
+
+    if not os.path.splitext(name)[1]:
+        content_type = (headers.get("Content-Type") or "").split(";")[0].strip()
+        extension = mimetypes.guess_extension(content_type) if content_type else None
+        if extension:
+            name += extension
+    return name
+
+
+def _new_path(name: str) -> str:
+    return os.path.join(tempfile.mkdtemp(prefix="docling-"), _safe_name(name))
+
+
+def _link_or_copy(source_path: str, target_path: str):
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copyfile(source_path, target_path)
+
+
+async def _store_blocks(name: str, blocks: AsyncIterator[bytes], max_bytes: int) -> SourceFile:
+    """
+    Consume a stream of blocks into a SourceFile, hashing on the way
+
+    Content up to IN_MEMORY_MAX_BYTES is kept in memory; anything larger is
+    written to a temporary file block by block, so it is never held in RAM.
+
+    Raises:
+        SourceTooLargeError: If the stream exceeds max_bytes
+    """
+    digest = hashlib.sha256()
+    size = 0
+    buffer = bytearray()
+    path = None
+    f = None
+    try:
+        async for block in blocks:
+            size += len(block)
+            if size > max_bytes:
+                raise SourceTooLargeError(
+                    f"Document {name} exceeds the {max_bytes // (1024 * 1024)} MB limit"
+                )
+            digest.update(block)
+            if f is None and size <= IN_MEMORY_MAX_BYTES:
+                buffer.extend(block)
+                continue
+            if f is None:
+                path = _new_path(name)
+                f = open(path, "wb")
+                await run_in_threadpool(f.write, bytes(buffer))
+                buffer = None
+            await run_in_threadpool(f.write, block)
+    except BaseException:
+        if f is not None:
+            f.close()
+        if path is not None:
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+        raise
+    if f is not None:
+        f.close()
+
+    return SourceFile(
+        name=name,
+        path=path,
+        sha256=digest.hexdigest(),
+        size=size,
+        data=bytes(buffer) if path is None else None
+    )
+
+
+class UploadSpool(tempfile.SpooledTemporaryFile):
+    """
+    Spool for multipart file parts that rolls over to a named file in its own
+    temporary directory (instead of an anonymous one), so save_upload can
+    take the file over rather than copy it. Deleted on close unless taken.
+    """
+
+    def __init__(self, max_size: int = 0, **kwargs):
+        super().__init__(max_size=max_size, **kwargs)
+        self.path: Optional[str] = None
+        self.taken = False
+
+    def rollover(self):
+        if self._rolled:
+            return
+        memory = self._file
+        path = _new_path("upload")
+        file = open(path, "w+b")
+        position = memory.tell()
+        file.write(memory.getvalue())
+        file.seek(position)
+        self._file = file
+        self.path = path
+        self._rolled = True
+
+    def close(self):
+        super().close()
+        if self.path is not None and not self.taken:
+            shutil.rmtree(os.path.dirname(self.path), ignore_errors=True)
+
+
+def _take_spool(spool: UploadSpool, name: str, max_bytes: int) -> SourceFile:
+    """Hash a rolled-over upload spool and move its file into a SourceFile"""
+    spool.flush()
+    size = os.path.getsize(spool.path)
+    if size > max_bytes:
+        raise SourceTooLargeError(f"Document {name} exceeds the {max_bytes // (1024 * 1024)} MB limit")
+    digest = hashlib.sha256()
+    with open(spool.path, "rb") as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            digest.update(block)
+    path = os.path.join(os.path.dirname(spool.path), name)
+    os.rename(spool.path, path)
+    spool.taken = True
+    return SourceFile(name=name, path=path, sha256=digest.hexdigest(), size=size)
+
+
+async def save_upload(upload, max_bytes: Optional[int] = None) -> SourceFile:
+    """
+    Store an uploaded file, hashing it on the way
+
+    An upload already spooled to disk by the multipart parser (see
+    UploadSpool) is moved, not copied; others are copied block by block.
+
+    Args:
+        upload: Starlette/FastAPI UploadFile
+        max_bytes: Size limit (defaults to MAX_UPLOAD_BYTES)
+
+    Returns:
+        SourceFile describing the stored document
+
+    Raises:
+        SourceTooLargeError: If the upload exceeds max_bytes
+    """
+    name = _safe_name(upload.filename)
+    max_bytes = max_bytes if max_bytes is not None else MAX_UPLOAD_BYTES
+    spool = upload.file
+    if isinstance(spool, UploadSpool) and spool.path is not None and not spool.taken:
+        return await run_in_threadpool(_take_spool, spool, name, max_bytes)
+
+    async def blocks():
+        while True:
+            block = await upload.read(BLOCK_SIZE)
+            if not block:
+                return
+            yield block
+
+    return await _store_blocks(name, blocks(), max_bytes)
+
+
+class DownloadCache:
+    """
+    Downloaded documents with their validators (ETag / Last-Modified)
+
+    Entries are keyed by URL and only reused after the server confirmed them
+    with a 304, so a changed document is always downloaded again. The
+    directory is bounded by total size, evicting least recently used entries.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if max_bytes > 0:
+            os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url: str):
+        base = os.path.join(self.directory, hashlib.sha256(url.encode("utf-8")).hexdigest())
+        return f"{base}.json", f"{base}.body"
+
+    def lookup(self, url: str) -> Optional[dict]:
+        """Validators and metadata of a cached download, if any"""
+        if self.max_bytes <= 0:
+            return None
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(body_path):
+            return None
+        return meta
+
+    def open_entry(self, url: str, meta: dict) -> SourceFile:
+        """Materialise a revalidated entry as a new SourceFile"""
+        _, body_path = self._paths(url)
+        os.utime(body_path)
+        if meta["size"] <= IN_MEMORY_MAX_BYTES:
+            with open(body_path, "rb") as f:
+                data = f.read()
+            return SourceFile(name=meta["name"], path=None, sha256=meta["sha256"],
+                              size=meta["size"], data=data)
+        path = _new_path(meta["name"])
+        _link_or_copy(body_path, path)
+        return SourceFile(name=meta["name"], path=path, sha256=meta["sha256"], size=meta["size"])
+
+    def store(self, url: str, source: SourceFile, etag: Optional[str], last_modified: Optional[str]):
+        """Keep a download that the server can revalidate later"""
+        if self.max_bytes <= 0 or source.size > self.max_bytes or not (etag or last_modified):
+            return
+        meta_path, body_path = self._paths(url)
+        suffix = f".{os.getpid()}.tmp"
+        try:
+            if source.data is not None:
+                with open(body_path + suffix, "wb") as f:
+                    f.write(source.data)
+            else:
+                _link_or_copy(source.path, body_path + suffix)
+            os.replace(body_path + suffix, body_path)
+            with open(meta_path + suffix, "w", encoding="utf-8") as f:
+                json.dump({
+                    "name": source.name,
+                    "sha256": source.sha256,
+                    "size": source.size,
+                    "etag": etag,
+                    "last_modified": last_modified
+                }, f)
+            os.replace(meta_path + suffix, meta_path)
+        except OSError as e:
+            logger.warning(f"Failed to cache download of {url}: {str(e)}")
+            return
+        self._evict()
+
+    def _evict(self):
+        try:
+            bodies = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and entry.name.endswith(".body"):
+                    stat = entry.stat()
+                    bodies.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            for _, size, body_path in sorted(bodies):
+                if total <= self.max_bytes:
+                    break
+                os.unlink(body_path)
+                meta_path = body_path[:-len(".body")] + ".json"
+                if os.path.exists(meta_path):
+                    os.unlink(meta_path)
+                total -= size
+        except OSError as e:
+            logger.warning(f"Download cache eviction failed: {str(e)}")
+
+
+class Fetcher:
+    """
+    Downloads URL sources through one pooled async HTTP client
+
+    Bodies are streamed (to memory or disk, see _store_blocks) with a size cap
+    and an overall time limit, and revalidated against the DownloadCache with
+    conditional requests so unchanged documents are not transferred again.
+    """
+
+    def __init__(self, download_cache: DownloadCache):
+        self.download_cache = download_cache
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                timeout=httpx.Timeout(FETCH_TIMEOUT, connect=FETCH_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=FETCH_MAX_CONNECTIONS,
+                    max_keepalive_connections=FETCH_MAX_CONNECTIONS
+                ),
+                headers={"User-Agent": "docling-service"}
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch(self, url: str, max_bytes: Optional[int] = None) -> SourceFile:
+        """
+        Download a document, reusing the cached copy when the server answers 304
+
+        Args:
+            url: HTTP(S) URL of the document
+            max_bytes: Size limit (defaults to DOCLING_MAX_DOWNLOAD_MB)
+
+        Returns:
+            SourceFile describing the downloaded document
+
+        Raises:
+            SourceTooLargeError: If the document exceeds max_bytes
+            asyncio.TimeoutError: If the download takes longer than FETCH_TIMEOUT
+            httpx.HTTPError: On network errors and non-2xx responses
+        """
+        max_bytes = max_bytes if max_bytes is not None else MAX_DOWNLOAD_MB * 1024 * 1024
+        return await asyncio.wait_for(self._fetch(url, max_bytes), timeout=FETCH_TIMEOUT)
+
+    async def _fetch(self, url: str, max_bytes: int) -> SourceFile:
+        cached = await run_in_threadpool(self.download_cache.lookup, url)
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        async with self.client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 304 and cached:
+                logger.info(f"Download cache revalidated: {url}")
+                return await run_in_threadpool(self.download_cache.open_entry, url, cached)
+            response.raise_for_status()
+
+            content_length = response.headers.get("Content-Length")
+            if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+                raise SourceTooLargeError(
+                    f"Document at {url} exceeds the {max_bytes // (1024 * 1024)} MB limit"
+                )
+
+            name = _filename_from_response(str(response.url), response.headers)
+            source = await _store_blocks(name, response.aiter_bytes(BLOCK_SIZE), max_bytes)
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+        await run_in_threadpool(self.download_cache.store, url, source, etag, last_modified)
+        return source
+
+
+fetcher = Fetcher(DownloadCache(DOWNLOAD_CACHE_DIR, DOWNLOAD_CACHE_MB * 1024 * 1024))
@@ -16,6 +16,14 @@ def test_health():
     print(f"Response: {response.json()}\n")
     return response.status_code == 200
 
+def test_ready():
+    """Test readiness endpoint (503 while models are still warming up)"""
+    print("Testing readiness endpoint...")
+    response = requests.get(f"{BASE_URL}/ready")
+    print(f"Status: {response.status_code}")
+    print(f"Response: {json.dumps(response.json(), indent=2)}\n")
+    return response.status_code == 200
+
 def test_root():
     """Test root endpoint"""
     print("Testing root endpoint...")
@@ -125,6 +133,7 @@ if __name__ == "__main__":
     
     tests = [
         ("Health Check", test_health),
+        ("Readiness", test_ready),
         ("Root Endpoint", test_root),
         ("URL Conversion", test_convert_url),
         ("File Upload", test_convert_file),
@@ -0,0 +1,10 @@
+"""
+Unit tests of the service modules
+
+Run from the repository root with ``python -m pytest``. The tests do not
+load Docling or any model.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import os
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import main
+import sources
+
+
+def post_batch(**kwargs) -> httpx.Response:
+    async def send():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/chunk/batch", **kwargs)
+    return asyncio.run(send())
+
+
+@pytest.fixture
+def uploads_on_disk(monkeypatch):
+    monkeypatch.setattr(sources, "IN_MEMORY_MAX_BYTES", 0)
+
+
+@pytest.fixture
+def chunked(monkeypatch):
+    """Replace chunking with a check that the item's document is still there"""
+    calls = []
+
+    async def chunk_source(source, item):
+        assert source.path is None or os.path.exists(source.path)
+        await asyncio.sleep(0.01)
+        calls.append((source.name, item.max_tokens))
+        return main.ChunkResponse(success=True, chunks=[], total_chunks=0)
+
+    monkeypatch.setattr(main, "chunk_source", chunk_source)
+    return calls
+
+
+def ndjson(response: httpx.Response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_items_may_share_an_upload(uploads_on_disk, chunked):
+    items = [{"upload": "a.pdf", "max_tokens": 256}, {"upload": "a.pdf", "max_tokens": 512}]
+    response = post_batch(files=[("files", ("a.pdf", b"%PDF-1.4 a"))], data={"items": json.dumps(items)})
+    lines = ndjson(response)
+    assert lines[-1] == {"done": True, "total": 2, "succeeded": 2, "failed": 0}
+    assert sorted(chunked) == [("a.pdf", 256), ("a.pdf", 512)]
+
+
+def test_uploads_without_items_use_defaults(chunked):
+    response = post_batch(files=[("files", ("a.pdf", b"a")), ("files", ("b.pdf", b"b"))])
+    assert ndjson(response)[-1]["succeeded"] == 2
+    assert sorted(name for name, _ in chunked) == ["a.pdf", "b.pdf"]
+
+
+def test_duplicate_upload_names_are_rejected(chunked):
+    response = post_batch(files=[("files", ("a.pdf", b"one")), ("files", ("a.pdf", b"two"))])
+    assert response.status_code == 400
+    assert "Duplicate upload name" in response.json()["detail"]
+    assert chunked == []
+
+
+def test_missing_upload_reference_is_rejected(chunked):
+    items = [{"upload": "b.pdf"}]
+    response = post_batch(files=[("files", ("a.pdf", b"a"))], data={"items": json.dumps(items)})
+    assert response.status_code == 400
+    assert "missing uploads: b.pdf" in response.json()["detail"]
+
+
+def test_empty_json_batch_is_rejected():
+    response = post_batch(json={"items": []})
+    assert response.status_code == 400
+
+
+def parse(**kwargs):
+    """Run parse_batch_request on a request built by httpx"""
+    request = httpx.Request("POST", "http://test/chunk/batch", **kwargs)
+    body = request.read()
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {
+        "type": "http", "method": "POST", "path": "/chunk/batch", "query_string": b"",
+        "headers": [(key.lower().encode(), value.encode()) for key, value in request.headers.items()],
+    }
+    return asyncio.run(main.parse_batch_request(Request(scope, receive)))
+
+
+def test_parse_json_batch():
+    items, uploads = parse(json={"items": [{"url": "http://example.com/a.pdf", "max_tokens": 128}]})
+    assert [(str(item.url), item.max_tokens) for item in items] == [("http://example.com/a.pdf", 128)]
+    assert uploads == {}
+
+
+def test_parse_multipart_batch(uploads_on_disk):
+    items = [{"upload": "a.pdf"}, {"url": "http://example.com/b.pdf"}]
+    parsed, uploads = parse(files=[("files", ("a.pdf", b"%PDF-1.4 a"))], data={"items": json.dumps(items)})
+    assert [item.upload for item in parsed] == ["a.pdf", None]
+    assert list(uploads) == ["a.pdf"]
+    uploads["a.pdf"].cleanup()
+
+
+@pytest.mark.parametrize("items, detail", [
+    ("not json", "Invalid batch request"),
+    (json.dumps([{"upload": "b.pdf"}]), "missing uploads: b.pdf"),
+])
+def test_rejected_batches_remove_their_uploads(uploads_on_disk, monkeypatch, items, detail):
+    saved = []
+
+    async def save_upload(file):
+        source = await sources.save_upload(file)
+        saved.append(source.path)
+        return source
+
+    monkeypatch.setattr(main, "save_upload", save_upload)
+    with pytest.raises(HTTPException) as error:
+        parse(files=[("files", ("a.pdf", b"%PDF-1.4 a"))], data={"items": items})
+    assert error.value.status_code == 400
+    assert detail in error.value.detail
+    assert saved and not any(os.path.exists(path) for path in saved)
+
+
+def test_batch_size_is_limited(monkeypatch):
+    monkeypatch.setattr(main, "BATCH_MAX_ITEMS", 1)
+    with pytest.raises(HTTPException) as error:
+        parse(json={"items": [{"url": "http://example.com/a.pdf"}, {"url": "http://example.com/b.pdf"}]})
+    assert "limit is 1" in error.value.detail
+
+
+def test_oversized_batch_body_is_rejected_before_reading(monkeypatch, chunked):
+    monkeypatch.setattr(main, "BATCH_MAX_UPLOAD_MB", 1)
+    response = post_batch(files=[("files", ("a.pdf", b"a" * (2 * 1024 * 1024)))])
+    assert response.status_code == 413
+    assert chunked == []
@@ -0,0 +1,52 @@
+import os
+
+from docling_core.types.doc import DoclingDocument
+
+from cache import ConversionCache
+
+
+def document(name: str) -> DoclingDocument:
+    doc = DoclingDocument(name=name)
+    doc.add_text(label="text", text=f"Text of {name}")
+    return doc
+
+
+def test_keys_depend_on_content_and_options(tmp_path):
+    cache = ConversionCache(str(tmp_path), memory_items=2, disk_bytes=1 << 20)
+    key = cache.make_key("abc", profile="fast")
+    assert key == cache.make_key("abc", profile="fast")
+    assert key != cache.make_key("abc", profile="full")
+    assert key != cache.make_key("abd", profile="fast")
+
+
+def test_memory_then_disk_tier(tmp_path):
+    cache = ConversionCache(str(tmp_path), memory_items=1, disk_bytes=1 << 20)
+    cache.put("a", document("a"))
+    cache.put("b", document("b"))  # pushes a out of memory
+    assert cache.get("b")[1] == "memory"
+    doc, tier = cache.get("a")
+    assert tier == "disk"
+    assert doc.texts[0].text == "Text of a"
+    assert cache.get("a")[1] == "memory"
+    assert cache.get("missing") == (None, None)
+    assert cache.stats() == {"hits": 3, "misses": 1, "memory_items": 1}
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    cache = ConversionCache(str(tmp_path), memory_items=0, disk_bytes=1)
+    cache.put("a", document("a"))
+    assert not os.listdir(tmp_path)
+
+
+def test_unreadable_entries_are_dropped(tmp_path):
+    cache = ConversionCache(str(tmp_path), memory_items=0, disk_bytes=1 << 20)
+    (tmp_path / "bad.json").write_text("{not json")
+    assert cache.get("bad") == (None, None)
+    assert not (tmp_path / "bad.json").exists()
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = ConversionCache(str(tmp_path / "cache"), memory_items=2, disk_bytes=1 << 20, enabled=False)
+    cache.put("a", document("a"))
+    assert cache.get("a") == (None, None)
+    assert not (tmp_path / "cache").exists()
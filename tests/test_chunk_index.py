@@ -0,0 +1,61 @@
+import sqlite3
+
+import pytest
+
+from chunk_index import ChunkIndex, diff_chunk_ids
+
+
+@pytest.fixture
+def index(tmp_path):
+    return ChunkIndex(str(tmp_path / "index.sqlite3"))
+
+
+def test_diff_chunk_ids():
+    assert diff_chunk_ids(["a", "b"], ["b", "c"]) == {"added": ["c"], "unchanged": ["b"], "removed": ["a"]}
+    assert diff_chunk_ids(None, ["a"]) == {"added": ["a"], "unchanged": [], "removed": []}
+
+
+def test_unacknowledged_runs_diff_against_the_same_base(index):
+    first = index.update("f", ["a", "b"])
+    assert first["added"] == ["a", "b"]
+    assert index.acknowledge("f", first["revision"])
+
+    changed = index.update("f", ["a", "c"])
+    # Response lost: the retry must report the same changes
+    retry = index.update("f", ["a", "c"])
+    assert retry == changed
+    assert retry["added"] == ["c"] and retry["removed"] == ["b"]
+
+    assert index.acknowledge("f", retry["revision"])
+    assert index.get("f") == ["a", "c"]
+    assert index.update("f", ["a", "c"])["added"] == []
+
+
+def test_acknowledge_is_idempotent_and_rejects_stale_revisions(index):
+    old = index.update("f", ["a"])["revision"]
+    new = index.update("f", ["b"])["revision"]
+    assert index.acknowledge("f", old) is False
+    assert index.acknowledge("f", new) is True
+    assert index.acknowledge("f", new) is True
+    assert index.acknowledge("missing", new) is None
+
+
+def test_get_returns_only_acknowledged_ids(index):
+    index.update("f", ["a"])
+    assert index.get("f") is None
+    assert index.forget("f")
+    assert not index.forget("f")
+
+
+def test_tables_without_revisions_are_migrated(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE chunk_index (file_id TEXT PRIMARY KEY, chunk_ids TEXT NOT NULL, updated_at REAL NOT NULL)")
+    conn.execute("""INSERT INTO chunk_index VALUES ('f', '["a", "b"]', 0)""")
+    conn.commit()
+    conn.close()
+
+    index = ChunkIndex(path)
+    assert index.get("f") == ["a", "b"]
+    assert index.update("f", ["a"])["removed"] == ["b"]
+    assert index.update("new", ["x"])["added"] == ["x"]
@@ -0,0 +1,44 @@
+from docling_core.transforms.chunker import DocChunk, DocMeta
+from docling_core.types.doc import BoundingBox, CoordOrigin, DoclingDocument, ProvenanceItem, Size
+
+import pipeline
+
+
+def provenance(page_no: int, top: float) -> ProvenanceItem:
+    bbox = BoundingBox(l=10, t=top, r=50, b=top - 10, coord_origin=CoordOrigin.BOTTOMLEFT)
+    return ProvenanceItem(page_no=page_no, bbox=bbox, charspan=(0, 1))
+
+
+def chunk_of_two_pages():
+    doc = DoclingDocument(name="doc")
+    for page_no in (1, 2):
+        doc.add_page(page_no=page_no, size=Size(width=100, height=100))
+    title = doc.add_heading(text="Intro", prov=provenance(1, 90))
+    first = doc.add_text(label="text", text="First", prov=provenance(1, 70))
+    second = doc.add_text(label="text", text="Second", prov=provenance(2, 90))
+    chunk = DocChunk(text="First Second", meta=DocMeta(doc_items=[title, first, second], headings=["Intro"]))
+    return chunk, doc
+
+
+def test_requested_fields_only():
+    chunk, doc = chunk_of_two_pages()
+    assert pipeline._chunk_metadata(chunk, doc, ("pages",), None) == {"pages": [1, 2]}
+
+
+def test_all_fields():
+    chunk, doc = chunk_of_two_pages()
+    metadata = pipeline._chunk_metadata(chunk, doc, pipeline.CHUNK_METADATA_FIELDS, "Intro\nFirst Second")
+    assert metadata == {
+        "headings": ["Intro"],
+        "pages": [1, 2],
+        # Top-left origin: 100 - top
+        "bboxes": [[1, 10.0, 10.0, 50.0, 20.0], [1, 10.0, 30.0, 50.0, 40.0], [2, 10.0, 10.0, 50.0, 20.0]],
+        "labels": ["section_header", "text"],
+        "contextualized": "Intro\nFirst Second",
+    }
+
+
+def test_repeated_boxes_are_listed_once():
+    chunk, doc = chunk_of_two_pages()
+    chunk.meta.doc_items.append(chunk.meta.doc_items[1])
+    assert len(pipeline._chunk_metadata(chunk, doc, ("bboxes",), None)["bboxes"]) == 3
@@ -0,0 +1,46 @@
+import pytest
+
+from chunkers import ChunkerRegistry, UnknownTokenizerError
+
+
+class FakeRegistry(ChunkerRegistry):
+    """Builds placeholder chunkers instead of loading a tokenizer"""
+
+    def __init__(self, **kwargs):
+        super().__init__({"minilm": "model", "other": "model2"}, "minilm", **kwargs)
+        self.built = []
+
+    def _build_chunker(self, key):
+        self.built.append(key)
+        return object()
+
+
+def test_chunkers_are_reused():
+    registry = FakeRegistry(presets=[])
+    assert registry.get_chunker(None, 256, True) is registry.get_chunker("minilm", 256, True)
+    assert registry.built == [("minilm", 256, True)]
+
+
+def test_request_configurations_are_bounded():
+    registry = FakeRegistry(presets=[], cache_size=2)
+    first = registry.get_chunker(None, 100, True)
+    registry.get_chunker(None, 200, True)
+    registry.get_chunker(None, 100, True)  # most recently used again
+    registry.get_chunker(None, 300, True)  # evicts 200
+    assert registry.get_chunker(None, 100, True) is first
+    registry.get_chunker(None, 200, True)
+    assert registry.built.count(("minilm", 200, True)) == 2
+
+
+def test_presets_are_never_evicted():
+    registry = FakeRegistry(presets=[(None, 512, True)], cache_size=1)
+    registry.warm_up()
+    preset = registry.get_chunker(None, 512, True)
+    for max_tokens in range(100, 110):
+        registry.get_chunker(None, max_tokens, True)
+    assert registry.get_chunker("minilm", 512, True) is preset
+
+
+def test_unknown_tokenizer():
+    with pytest.raises(UnknownTokenizerError):
+        FakeRegistry(presets=[]).get_chunker("nope", 512, True)
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+import pipeline
+from chunkers import ChunkerRegistry
+from embeddings import EmbeddingModels
+
+
+class FakeTokenizer:
+    """Splits on spaces between [CLS]=0 and [SEP]=1, recording call options"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, **kwargs):
+        self.calls.append(kwargs)
+        return {"input_ids": [[0] + [len(word) + 1 for word in text.split()] + [1] for text in texts]}
+
+
+class FakeRegistry(ChunkerRegistry):
+    def __init__(self):
+        super().__init__({"minilm": "model"}, "minilm", presets=[])
+        self.tokenizer = FakeTokenizer()
+
+    def get_tokenizer(self, name=None):
+        return self.tokenizer
+
+
+def test_tokenize_does_not_reconfigure_the_shared_tokenizer():
+    registry = FakeRegistry()
+    models = EmbeddingModels(registry, max_length=4)
+    assert models.tokenize(["a bb", "a bb ccc dddd"]) == [[0, 2, 3, 1], [0, 2, 3, 1]]
+    assert all("truncation" not in call and "max_length" not in call for call in registry.tokenizer.calls)
+
+
+def test_truncate_keeps_the_closing_token():
+    models = EmbeddingModels(FakeRegistry(), max_length=3)
+    assert models.truncate([[0, 5, 1], [0, 5, 6, 7, 1]]) == [[0, 5, 1], [0, 5, 1]]
+
+
+@pytest.fixture
+def embedded(monkeypatch):
+    """Count tokenizer calls and record the token ids handed to embed()"""
+    state = {"tokenized": 0, "input_ids": []}
+
+    def tokenize(texts, tokenizer=None):
+        state["tokenized"] += 1
+        return [[0, len(text), 1] for text in texts]
+
+    def embed(texts, name=None, input_ids=None):
+        state["input_ids"].append(input_ids)
+        return np.ones((len(texts), 2), dtype=np.float32)
+
+    monkeypatch.setattr(pipeline, "tokenize", tokenize)
+    monkeypatch.setattr(pipeline.embedding_models, "embed", embed)
+    return state
+
+
+def test_counted_token_ids_are_reused_for_embedding(embedded):
+    settings = pipeline.ChunkSettings(embed=True)
+    chunks = pipeline._format_chunks(["a", "bb"], 0, settings, {}, ["a", "bb"])
+    assert [chunk["tokens"] for chunk in chunks] == [3, 3]
+    assert embedded["tokenized"] == 1
+    assert embedded["input_ids"] == [[[0, 1, 1], [0, 2, 1]]]
+
+
+def test_contextualized_texts_are_tokenized_for_embedding(embedded):
+    settings = pipeline.ChunkSettings(embed=True, contextualize=True)
+    pipeline._format_chunks(["a", "bb"], 0, settings, {}, ["H\na", "H\nbb"])
+    assert embedded["input_ids"] == [None]
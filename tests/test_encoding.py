@@ -0,0 +1,53 @@
+import gzip
+import json
+
+import msgpack
+import zstandard
+from starlette.requests import Request
+
+import encoding
+
+PAYLOAD = {"success": True, "chunks": ["text " * 20] * 20}
+
+
+def respond(payload=PAYLOAD, **headers):
+    scope = {
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()],
+    }
+    return encoding.encode_response(Request(scope), payload)
+
+
+def test_json_by_default():
+    response = respond()
+    assert response.media_type == "application/json"
+    assert "content-encoding" not in response.headers
+    assert json.loads(response.body) == PAYLOAD
+    assert response.headers["vary"] == "Accept, Accept-Encoding"
+
+
+def test_msgpack_when_accepted():
+    response = respond(accept="application/json;q=0.5, application/x-msgpack")
+    assert response.media_type == "application/msgpack"
+    assert msgpack.unpackb(response.body) == PAYLOAD
+
+
+def test_msgpack_refused_with_zero_quality():
+    assert respond(accept="application/msgpack;q=0").media_type == "application/json"
+
+
+def test_zstd_preferred_over_gzip():
+    response = respond(accept_encoding="gzip, zstd")
+    assert response.headers["content-encoding"] == "zstd"
+    assert json.loads(zstandard.ZstdDecompressor().decompress(response.body)) == PAYLOAD
+
+
+def test_gzip_when_accepted():
+    response = respond(accept_encoding="gzip, zstd;q=0")
+    assert response.headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.body)) == PAYLOAD
+
+
+def test_small_bodies_are_not_compressed():
+    response = respond({"success": True}, accept_encoding="zstd")
+    assert "content-encoding" not in response.headers
@@ -0,0 +1,63 @@
+import pytest
+
+import converters
+import pipeline
+from sources import SourceFile
+
+
+def source(name: str, data: bytes) -> SourceFile:
+    return SourceFile(name=name, path=None, sha256="x", size=len(data), data=data)
+
+
+@pytest.mark.parametrize("name, data, expected", [
+    ("report.pdf", b"%PDF-1.7\n", "pdf"),
+    ("report.bin", b"%PDF-1.7\n", "pdf"),
+    ("notes.md", b"# Title", "md"),
+    ("notes.MARKDOWN", b"# Title", "md"),
+    ("notes.txt", b"plain", "txt"),
+    ("page.htm", b"<p>hi</p>", "html"),
+    ("download", b"  <!DOCTYPE html><html></html>", "html"),
+    ("letter.docx", b"PK\x03\x04", "other"),
+])
+def test_sniff_format(name, data, expected):
+    assert pipeline.sniff_format(source(name, data)) == expected
+
+
+def test_pdf_magic_wins_over_the_extension():
+    assert not pipeline.is_light(source("scan.md", b"%PDF-1.4"))
+
+
+@pytest.fixture
+def text_layer(monkeypatch):
+    """Whether PDFs report a text layer, without opening them"""
+    state = {"text": True, "probed": 0}
+
+    def has_text_layer(source):
+        state["probed"] += 1
+        return state["text"]
+
+    monkeypatch.setattr(pipeline, "has_text_layer", has_text_layer)
+    return state
+
+
+def test_light_documents_get_the_light_converter(text_layer):
+    assert pipeline.pick_profile(source("a.md", b"# A"), "full") == converters.LIGHT
+    assert text_layer["probed"] == 0
+
+
+def test_auto_profile_follows_the_text_layer(text_layer):
+    pdf = source("a.pdf", b"%PDF-1.4")
+    assert pipeline.pick_profile(pdf, converters.AUTO) == converters.AUTO_TEXT_PROFILE
+    text_layer["text"] = False
+    assert pipeline.pick_profile(pdf, converters.AUTO) == converters.AUTO_SCANNED_PROFILE
+
+
+def test_explicit_and_non_pdf_profiles(text_layer):
+    assert pipeline.pick_profile(source("a.pdf", b"%PDF-1.4"), "full") == "full"
+    assert pipeline.pick_profile(source("a.docx", b"PK"), converters.AUTO) == converters.AUTO_TEXT_PROFILE
+    assert text_layer["probed"] == 0
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(converters.UnknownProfileError):
+        pipeline.pick_profile(source("a.pdf", b"%PDF-1.4"), "nope")
@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from jobs import FAILED, JobManager, JobStore, MemoryJobStore, QUEUED, RUNNING, SUCCEEDED
+
+
+def make_job(job_id: str, created_at: float) -> dict:
+    return {
+        "id": job_id, "kind": "convert", "status": QUEUED, "payload": {}, "webhook_url": None,
+        "result": None, "error": None, "created_at": created_at, "updated_at": created_at
+    }
+
+
+def test_incomplete_store_fails_on_instantiation():
+    class PartialStore(JobStore):
+        def create(self, job):
+            pass
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+
+def test_claim_only_once():
+    store = MemoryJobStore()
+    store.create(make_job("a", time.time()))
+    assert store.claim("a", time.time())
+    assert not store.claim("a", time.time())
+    assert store.get("a")["status"] == RUNNING
+
+
+def test_requeue_running_and_unfinished_order():
+    store = MemoryJobStore()
+    store.create(make_job("late", 2.0))
+    store.create(make_job("early", 1.0))
+    store.claim("late", 3.0)
+    assert store.requeue_running(4.0) == 1
+    assert [job["id"] for job in store.unfinished()] == ["early", "late"]
+
+
+def run_job(handler, memory_wait: float = 0, busy_wait: float = 0, kind: str = "convert") -> dict:
+    """Run one queued job through a JobManager and return its final state"""
+    store = MemoryJobStore()
+    store.create(make_job("a", time.time()))
+    manager = JobManager(store_factory=lambda: store, retry_delay=0, busy_wait=busy_wait,
+                         memory_wait=memory_wait)
+    manager.register(kind, handler)
+    manager.store = store
+    asyncio.run(manager._run("a"))
+    return store.get("a")
+
+
+def refused(times: int, status_code: int):
+    """Handler refusing the first ``times`` calls with ``status_code``"""
+    calls = []
+
+    async def handler(payload):
+        calls.append(payload)
+        if len(calls) <= times:
+            raise HTTPException(status_code=status_code, detail="Try again later")
+        return {"success": True}
+    return handler
+
+
+def test_jobs_wait_for_a_free_worker():
+    assert run_job(refused(3, 429), busy_wait=60)["status"] == SUCCEEDED
+
+
+def test_jobs_stop_waiting_for_a_free_worker():
+    job = run_job(refused(1, 429), busy_wait=0)
+    assert job["status"] == FAILED
+    assert job["error"] == "Try again later"
+
+
+def test_unknown_job_kind_fails():
+    job = run_job(refused(0, 429), kind="other")
+    assert job["status"] == FAILED
+    assert job["error"] == "Unknown job kind: convert"
+
+
+def test_jobs_wait_for_memory():
+    assert run_job(refused(3, 503), memory_wait=60)["status"] == SUCCEEDED
+
+
+def test_jobs_stop_waiting_for_memory():
+    job = run_job(refused(1, 503), memory_wait=0)
+    assert job["status"] == FAILED
+    assert job["error"] == "Try again later"
+
+
+def test_stopping_requeues_running_jobs():
+    store = MemoryJobStore()
+    store.create(make_job("a", time.time()))
+    started = asyncio.Event()
+
+    async def handler(payload):
+        started.set()
+        await asyncio.sleep(60)
+
+    async def scenario():
+        manager = JobManager(store_factory=lambda: store, workers=1)
+        manager.register("convert", handler)
+        await manager.start()
+        await started.wait()
+        assert store.get("a")["status"] == RUNNING
+        await manager.stop()
+    asyncio.run(scenario())
+    assert store.get("a")["status"] == QUEUED
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import main
+import metrics
+import pipeline
+from sources import SourceFile
+import workers
+from workers import MemoryPressureError, WorkerPool
+
+
+@pytest.fixture
+def checked(monkeypatch):
+    """Refuse every conversion at the memory check, recording the cost checked"""
+    costs = []
+
+    def check_memory(cost, extra_mb=0):
+        costs.append((cost, extra_mb))
+        raise MemoryPressureError("low memory")
+
+    monkeypatch.setattr(main.workers, "check_memory", check_memory)
+    monkeypatch.setattr(pipeline, "count_pages", lambda source: 1000)
+    monkeypatch.setattr(pipeline, "SHARD_PAGES", 50)
+    monkeypatch.setattr(main, "SHARD_WORKERS", 2)
+    monkeypatch.setattr(main, "shard_pool", WorkerPool(max_workers=2, max_queue=8, mode="process"))
+    monkeypatch.setattr(workers, "MEMORY_MODEL_MB", 1000)
+    return costs
+
+
+def convert(**kwargs):
+    source = SourceFile(name="a.pdf", path=None, sha256="a", size=10, data=b"%PDF-1.4")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.convert_document(source, profile="fast", **kwargs))
+    assert error.value.status_code == 503
+
+
+def test_sharded_conversions_check_the_pages_in_flight(checked):
+    # Two shards of 50 pages at a time, and the models of both shard processes
+    convert(parallel_pages=True)
+    assert checked == [(100, 2000)]
+
+
+def test_whole_conversions_check_every_page(checked):
+    convert(parallel_pages=False)
+    assert checked == [(1000, 0)]
+
+
+def test_inactive_file_pages_count_as_available(monkeypatch):
+    values = {"/sys/fs/cgroup/memory.max": 1000, "/sys/fs/cgroup/memory.current": 900}
+    monkeypatch.setattr(metrics, "_read_int", values.get)
+    monkeypatch.setattr(metrics, "_read_stat", lambda path, key: 300 if key == "inactive_file" else None)
+    # MemAvailable of the test machine, if any, is far above 400 bytes
+    assert metrics.available_memory_bytes() == 400
+
+
+def test_read_stat(tmp_path):
+    stat = tmp_path / "memory.stat"
+    stat.write_text("anon 100\nfile 50\ninactive_file 30\n")
+    assert metrics._read_stat(str(stat), "inactive_file") == 30
+    assert metrics._read_stat(str(stat), "active_file") is None
+    assert metrics._read_stat(str(tmp_path / "missing"), "inactive_file") is None
+
+
+def test_process_workers_count_their_models(checked, monkeypatch):
+    monkeypatch.setattr(main, "pool", WorkerPool(max_workers=2, max_queue=8, mode="process"))
+    convert(parallel_pages=False)
+    assert checked == [(1000, 1000)]
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from docling_core.types.doc import BoundingBox, DoclingDocument, ProvenanceItem, Size
+from fastapi import HTTPException
+
+import main
+import pipeline
+from sources import SourceFile
+from workers import WorkerPool
+
+
+def shard_document(first: int, last: int) -> DoclingDocument:
+    """A document as converted from one shard: pages numbered from 1"""
+    doc = DoclingDocument(name="shard")
+    for page_no in range(1, last - first + 2):
+        doc.add_page(page_no=page_no, size=Size(width=1, height=1))
+        doc.add_text(label="text", text=f"page {first + page_no - 1}", prov=ProvenanceItem(
+            page_no=page_no, bbox=BoundingBox(l=0, t=0, r=1, b=1), charspan=(0, 1)
+        ))
+    return doc
+
+
+def test_plan_shards():
+    assert pipeline.plan_shards(120, shard_pages=50) == [(1, 50), (51, 100), (101, 120)]
+    assert pipeline.plan_shards(120, (40, 200), shard_pages=50) == [(40, 89), (90, 120)]
+
+
+def test_shift_pages():
+    doc = shard_document(1, 2)
+    pipeline._shift_pages(doc, 10)
+    assert sorted(doc.pages) == [11, 12]
+    assert [page.page_no for page in doc.pages.values()] == [11, 12]
+    assert [text.prov[0].page_no for text in doc.texts] == [11, 12]
+
+
+def test_merge_documents_numbers_pages_like_an_unsharded_conversion():
+    merged = pipeline.merge_documents([shard_document(11, 12), shard_document(13, 15)], first_page=11)
+    assert sorted(merged.pages) == [11, 12, 13, 14, 15]
+    assert [(text.text, text.prov[0].page_no) for text in merged.texts] == [
+        (f"page {page_no}", page_no) for page_no in range(11, 16)
+    ]
+
+
+@pytest.fixture
+def sharded(monkeypatch):
+    """A 500-page PDF split into ten shards, with a shard pool smaller than that"""
+    state = {"running": 0, "peak": 0, "started": [], "finished": [], "fail": None}
+    lock = threading.Lock()
+
+    def convert_source(source, page_range, profile):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+            state["started"].append(page_range)
+        time.sleep(0.02)
+        with lock:
+            state["running"] -= 1
+            state["finished"].append(time.monotonic())
+        if page_range == state["fail"]:
+            raise ValueError("broken shard")
+        return shard_document(*page_range), {}
+
+    shard_pool = WorkerPool(max_workers=2, max_queue=1, name="shard")
+    monkeypatch.setattr(pipeline, "count_pages", lambda source: 500)
+    monkeypatch.setattr(pipeline, "convert_source", convert_source)
+    monkeypatch.setattr(main.workers, "check_memory", lambda cost, extra_mb=0: None)
+    monkeypatch.setattr(main, "SHARD_WORKERS", 2)
+    monkeypatch.setattr(main, "shard_pool", shard_pool)
+    yield state
+    shard_pool.shutdown()
+
+
+def convert():
+    source = SourceFile(name="a.pdf", path=None, sha256="a", size=10, data=b"%PDF-1.4")
+    return asyncio.run(main.convert_document(source, parallel_pages=True, profile="fast"))
+
+
+def test_long_documents_do_not_fill_the_shard_pool(sharded):
+    doc = convert()
+    assert len(sharded["started"]) == 10
+    assert sharded["peak"] <= 2
+    assert sorted(doc.pages) == list(range(1, 501))
+
+
+def test_failing_shard_stops_the_others_after_the_running_ones(sharded):
+    sharded["fail"] = (101, 150)
+    with pytest.raises(ValueError):
+        convert()
+    returned = time.monotonic()
+    assert len(sharded["started"]) < 10
+    assert len(sharded["finished"]) == len(sharded["started"])
+    assert max(sharded["finished"]) <= returned
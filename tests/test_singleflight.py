@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    calls = []
+
+    async def convert():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "doc"
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.run("key", convert) for _ in range(3)))
+        assert [result for result, _ in results] == ["doc"] * 3
+        assert sorted(joined for _, joined in results) == [False, True, True]
+        assert flight.in_flight == 0
+        # Finished work is not reused
+        assert await flight.run("key", convert) == ("doc", False)
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_errors_reach_every_caller():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("broken")
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(flight.run("key", fail), flight.run("key", fail),
+                                       return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        assert flight.in_flight == 0
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    async def convert():
+        await asyncio.sleep(0.05)
+        return "doc"
+
+    async def scenario():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.run("key", convert))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flight.run("key", convert))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == ("doc", True)
+        with pytest.raises(asyncio.CancelledError):
+            await first
+    asyncio.run(scenario())
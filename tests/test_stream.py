@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import main
+import pipeline
+import sources
+import workers
+
+
+def chunk(index: int) -> dict:
+    return {"content": f"c{index}", "chunk": index, "chunk_id": f"id{index}",
+            "chunk_size": 2, "tokens": 1, "metadata": {}}
+
+
+@pytest.fixture
+def document(monkeypatch):
+    """A downloaded and converted document whose chunks come in two groups"""
+    async def fetch_source(url):
+        return sources.SourceFile(name="d.pdf", path=None, sha256="x", size=1, data=b"x")
+
+    async def load_document(source, options=None):
+        return object(), {}
+
+    def iter_chunk_batches(doc, settings, batch_size=pipeline.TOKEN_BATCH_SIZE, skip_ids=frozenset()):
+        yield [chunk(0), chunk(1)]
+        yield [chunk(2)]
+
+    monkeypatch.setattr(main, "fetch_source", fetch_source)
+    monkeypatch.setattr(main, "load_document", load_document)
+    monkeypatch.setattr(pipeline, "iter_chunk_batches", iter_chunk_batches)
+
+
+def stream(pool: workers.WorkerPool, monkeypatch) -> httpx.Response:
+    monkeypatch.setattr(main, "pool", pool)
+    monkeypatch.setattr(main.run_blocking, "__kwdefaults__", {"worker_pool": pool})
+
+    async def send():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/chunk?stream=true", json={"url": "http://example.com/d.pdf"})
+    return asyncio.run(send())
+
+
+def test_chunk_groups_run_in_the_pool(document, monkeypatch):
+    pool = workers.WorkerPool(max_workers=1, max_queue=1)
+    tasks = []
+    run = pool.run
+
+    async def counting_run(fn, *args, **kwargs):
+        tasks.append(fn.__name__)
+        return await run(fn, *args, **kwargs)
+
+    monkeypatch.setattr(pool, "run", counting_run)
+    lines = [json.loads(line) for line in stream(pool, monkeypatch).text.splitlines()]
+    assert [line["chunk"] for line in lines[:-1]] == [0, 1, 2]
+    assert lines[-1]["total_chunks"] == 3
+    # Two groups, then the call that finds the generator exhausted
+    assert tasks == ["next_chunk_batch"] * 3
+
+
+def test_busy_pool_answers_429(document, monkeypatch):
+    pool = workers.WorkerPool(max_workers=0, max_queue=0)
+    response = stream(pool, monkeypatch)
+    assert response.status_code == 429
+    assert "Retry-After" in response.headers
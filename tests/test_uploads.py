@@ -0,0 +1,63 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+from starlette.datastructures import UploadFile
+
+import main  # noqa: F401 - installs UploadSpool as the multipart spool
+import sources
+from sources import SourceTooLargeError, UploadSpool
+
+
+def rolled_spool(data: bytes) -> UploadSpool:
+    spool = UploadSpool(max_size=4)
+    spool.write(data)
+    spool.seek(0)
+    return spool
+
+
+def test_rolled_upload_is_moved_not_copied(monkeypatch):
+    async def no_copy(*args, **kwargs):
+        raise AssertionError("spooled upload was copied")
+
+    monkeypatch.setattr(sources, "_store_blocks", no_copy)
+    data = b"%PDF-1.4 " * 100
+    spool = rolled_spool(data)
+    spooled = spool.path
+    source = asyncio.run(sources.save_upload(UploadFile(spool, filename="a.pdf")))
+    spool.close()
+    assert not os.path.exists(spooled)
+    assert os.path.dirname(source.path) == os.path.dirname(spooled)
+    assert os.path.basename(source.path) == "a.pdf"
+    assert source.sha256 == hashlib.sha256(data).hexdigest()
+    assert source.size == len(data)
+    with open(source.path, "rb") as f:
+        assert f.read() == data
+    source.cleanup()
+
+
+def test_unclaimed_spool_is_removed_on_close():
+    spool = rolled_spool(b"%PDF-1.4 a")
+    directory = os.path.dirname(spool.path)
+    spool.close()
+    assert not os.path.exists(directory)
+
+
+def test_oversized_spool_is_rejected():
+    spool = rolled_spool(b"a" * 100)
+    with pytest.raises(SourceTooLargeError):
+        asyncio.run(sources.save_upload(UploadFile(spool, filename="a.pdf"), max_bytes=10))
+    directory = os.path.dirname(spool.path)
+    spool.close()
+    assert not os.path.exists(directory)
+
+
+def test_small_uploads_stay_in_memory():
+    spool = UploadSpool(max_size=1024)
+    spool.write(b"%PDF-1.4 a")
+    spool.seek(0)
+    source = asyncio.run(sources.save_upload(UploadFile(spool, filename="a.pdf")))
+    assert spool.path is None
+    assert source.data == b"%PDF-1.4 a"
+    spool.close()
@@ -0,0 +1,169 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import workers
+from workers import BULK, INTERACTIVE, PoolFullError, TaskClass, WorkerPool
+
+
+def task(client="a", priority=INTERACTIVE, cost=0):
+    return TaskClass(priority=priority, client=client, cost=cost)
+
+
+async def queue(pool, *task_classes):
+    """Queue acquisitions in order; returns their tasks once all are waiting"""
+    tasks = []
+    for task_class in task_classes:
+        tasks.append(asyncio.ensure_future(pool._acquire(task_class)))
+        await asyncio.sleep(0)
+    return tasks
+
+
+async def granted_after_finish(pool, running, tasks):
+    """Finish a running task and return the index of the waiter it handed its worker to"""
+    pool._finish(running)
+    await asyncio.sleep(0)
+    done = [i for i, t in enumerate(tasks) if t.done()]
+    assert len(done) == 1
+    return done[0]
+
+
+def test_interactive_goes_before_bulk():
+    async def scenario():
+        pool = WorkerPool(max_workers=1, max_queue=8)
+        running = task()
+        await pool._acquire(running)
+        tasks = await queue(pool, task(priority=BULK), task(priority=INTERACTIVE))
+        assert await granted_after_finish(pool, running, tasks) == 1
+    asyncio.run(scenario())
+
+
+def test_clients_with_fewer_running_tasks_go_first():
+    async def scenario():
+        pool = WorkerPool(max_workers=2, max_queue=8)
+        busy, other = task("a"), task("b")
+        await pool._acquire(busy)
+        await pool._acquire(other)
+        tasks = await queue(pool, task("a"), task("c"))
+        # a still runs a task after b finishes, so c goes first
+        assert await granted_after_finish(pool, other, tasks) == 1
+    asyncio.run(scenario())
+
+
+def test_smaller_documents_go_first():
+    async def scenario():
+        pool = WorkerPool(max_workers=1, max_queue=8)
+        running = task()
+        await pool._acquire(running)
+        tasks = await queue(pool, task("b", cost=100), task("c", cost=2))
+        assert await granted_after_finish(pool, running, tasks) == 1
+    asyncio.run(scenario())
+
+
+def test_starving_task_goes_first(monkeypatch):
+    async def scenario():
+        pool = WorkerPool(max_workers=1, max_queue=8)
+        running = task()
+        await pool._acquire(running)
+        tasks = await queue(pool, task("b", priority=BULK), task("c"))
+        monkeypatch.setattr(workers, "SCHEDULER_MAX_WAIT", 0)
+        assert await granted_after_finish(pool, running, tasks) == 0
+    asyncio.run(scenario())
+
+
+def test_client_cap_does_not_block_other_clients(monkeypatch):
+    async def scenario():
+        pool = WorkerPool(max_workers=2, max_queue=8, client_max_running=1)
+        running, other = task("a"), task("b")
+        await pool._acquire(running)
+        await pool._acquire(other)
+        tasks = await queue(pool, task("a"), task("c"))
+        # a's waiter is starving but capped: c gets the free worker
+        monkeypatch.setattr(workers, "SCHEDULER_MAX_WAIT", 0)
+        assert await granted_after_finish(pool, other, tasks) == 1
+        pool._finish(running)
+        await asyncio.sleep(0)
+        assert tasks[0].done()
+    asyncio.run(scenario())
+
+
+def test_pool_drains_for_a_starving_large_task(monkeypatch):
+    async def scenario():
+        # Estimates: 90 MB for each running task, 230 MB and 50 MB for the waiters
+        pool = WorkerPool(max_workers=2, max_queue=8, memory_budget_mb=300)
+        first, second = task("a", cost=10), task("b", cost=10)
+        await pool._acquire(first)
+        await pool._acquire(second)
+        tasks = await queue(pool, task("c", cost=45), task("d", cost=0))
+        monkeypatch.setattr(workers, "SCHEDULER_MAX_WAIT", 0)
+        pool._finish(first)
+        await asyncio.sleep(0)
+        # The small task would fit but waits so the large one gets the memory
+        assert not any(t.done() for t in tasks)
+        pool._finish(second)
+        await asyncio.sleep(0)
+        assert all(t.done() for t in tasks)
+        assert pool.reserved_mb == 280
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_is_dropped():
+    async def scenario():
+        pool = WorkerPool(max_workers=1, max_queue=8)
+        running = task()
+        await pool._acquire(running)
+        tasks = await queue(pool, task("b"), task("c"))
+        tasks[0].cancel()
+        await asyncio.sleep(0)
+        assert await granted_after_finish(pool, running, tasks[1:]) == 0
+        assert pool._waiting == []
+    asyncio.run(scenario())
+
+
+def test_run_rejects_tasks_beyond_capacity():
+    release = threading.Event()
+
+    async def scenario():
+        pool = WorkerPool(max_workers=1, max_queue=1)
+        first = asyncio.ensure_future(pool.run(release.wait, timeout=5))
+        second = asyncio.ensure_future(pool.run(lambda: "second", timeout=5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(PoolFullError):
+            await pool.run(lambda: "third")
+        release.set()
+        assert await first is True
+        assert await second == "second"
+        assert pool.in_flight == 0
+        pool.shutdown()
+    asyncio.run(scenario())
+
+
+def test_cancelled_run_waits_for_the_started_task():
+    finished = threading.Event()
+
+    def work():
+        time.sleep(0.05)
+        finished.set()
+
+    async def scenario():
+        pool = WorkerPool(max_workers=1, max_queue=1)
+        running = asyncio.ensure_future(pool.run(work, timeout=5))
+        await asyncio.sleep(0.01)
+        running.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await running
+        assert finished.is_set()
+        pool.shutdown()
+    asyncio.run(scenario())
+
+
+def test_spawned_processes_count_their_models(monkeypatch):
+    monkeypatch.setattr(workers, "MEMORY_MODEL_MB", 1000)
+    assert WorkerPool(max_workers=2, max_queue=1).spawn_memory_mb(2) == 0
+    pool = WorkerPool(max_workers=2, max_queue=1, mode="process")
+    assert pool.spawn_memory_mb(3) == 2000
+    pool._processes = 1
+    assert pool.spawn_memory_mb(1) == 0
+    assert pool.spawn_memory_mb(2) == 1000
@@ -0,0 +1,159 @@
+"""
+Startup warm-up: load models before the first request and track readiness
+
+Docling loads its layout/table/OCR models and the tokenizers lazily, so
+without a warm-up the first request after a deploy pays for all of it. The
+warm-up loads the configured tokenizers, converts a short Markdown text with
+the light converter and a tiny bundled PDF with every pre-warmed pipeline
+profile (none on light-only instances), and chunks the result, timing each
+step. With DOCLING_EMBED_WARMUP the embedding model is loaded as well.
+/ready reports the progress; /health stays a pure liveness check.
+
+Under gunicorn the master only preloads the model weights before forking,
+so the workers share their pages; each worker then runs the warm-up itself
+in the background while already answering /health and /metrics.
+"""
+from typing import Callable, Dict, List, Tuple
+import threading
+import logging
+import time
+import os
+
+import converters
+import pipeline
+from embeddings import embedding_models, EMBED_WARMUP
+from chunkers import registry as chunker_registry
+from sources import SourceFile
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.environ.get("DOCLING_WARMUP", "true").lower() not in ("0", "false", "no")
+WARMUP_DOCUMENT = os.environ.get(
+    "DOCLING_WARMUP_DOCUMENT",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "warmup.pdf")
+)
+
+
+# Converted by the light (model-free) converter
+LIGHT_DOCUMENT = b"# Warm-up\n\nThis document loads the Markdown backend.\n"
+
+
+def _load_document(path: str) -> SourceFile:
+    with open(path, "rb") as f:
+        data = f.read()
+    return SourceFile(name=os.path.basename(path), path=None, sha256="warmup", size=len(data), data=data)
+
+
+class WarmUp:
+    """
+    Runs the warm-up steps once and records their timings
+
+    A failing step is logged and reported but does not keep the service
+    from becoming ready: the same work is simply retried lazily by the first
+    request that needs it.
+    """
+
+    def __init__(self, enabled: bool = WARMUP_ENABLED, document: str = WARMUP_DOCUMENT):
+        self.enabled = enabled
+        self.document = document
+        self.ready = not enabled
+        self.running = False
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def steps(self) -> List[Tuple[str, Callable[[], None]]]:
+        """Named warm-up steps, in the order they run"""
+        doc_holder = {}
+
+        def convert(profile):
+            def step():
+                source = _load_document(self.document)
+                doc_holder["doc"], _ = pipeline.convert_source(source, profile=profile)
+            return step
+
+        def chunk():
+            doc = doc_holder.get("doc")
+            if doc is not None:
+                pipeline.chunk_document(doc, pipeline.ChunkSettings())
+
+        light_source = SourceFile(name="warmup.md", path=None, sha256="warmup-light",
+                                  size=len(LIGHT_DOCUMENT), data=LIGHT_DOCUMENT)
+
+        def convert_light():
+            doc, _ = pipeline.convert_source(light_source)
+            doc_holder.setdefault("doc", doc)
+
+        steps = [("tokenizers", chunker_registry.warm_up)]
+        if EMBED_WARMUP:
+            steps.append(("embeddings", embedding_models.warm_up))
+        steps.append(("convert:light", convert_light))
+        steps += [(f"convert:{profile}", convert(profile)) for profile in converters.WARM_PROFILES]
+        steps.append(("chunk", chunk))
+        return steps
+
+    def preload_steps(self) -> List[Tuple[str, Callable[[], None]]]:
+        """Named steps that load model weights without running inference"""
+        steps = [("preload:tokenizers", chunker_registry.warm_up)]
+        if EMBED_WARMUP:
+            steps.append(("preload:embeddings", embedding_models.get_model))
+        steps += [
+            (f"preload:{profile}", lambda profile=profile: converters.registry.load(profile))
+            for profile in converters.WARM_PROFILES
+        ]
+        return steps
+
+    def _run_steps(self, steps: List[Tuple[str, Callable[[], None]]]):
+        for name, step in steps:
+            step_started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                logger.error(f"Warm-up step {name} failed: {str(e)}")
+                self.errors[name] = str(e)
+            self.timings[name] = round(time.perf_counter() - step_started, 3)
+            logger.info(f"Warm-up step {name} took {self.timings[name]}s")
+
+    def preload(self):
+        """
+        Load the model weights (blocking; call in the gunicorn master before forking)
+
+        Does not mark the service ready: the workers still run the warm-up,
+        which then only pays for the first inference.
+        """
+        if self.enabled:
+            self._run_steps(self.preload_steps())
+
+    def run(self):
+        """Run every warm-up step (blocking; call from a worker thread)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.running or self.ready:
+                return
+            self.running = True
+
+        started = time.perf_counter()
+        try:
+            self._run_steps(self.steps())
+        except Exception as e:
+            logger.error(f"Warm-up failed: {str(e)}")
+            self.errors["warmup"] = str(e)
+        finally:
+            self.timings["total"] = round(time.perf_counter() - started, 3)
+            self.running = False
+            self.ready = True
+        logger.info(f"Warm-up finished in {self.timings['total']}s")
+
+    def status(self) -> dict:
+        """Readiness details returned by /ready"""
+        return {
+            "ready": self.ready,
+            "enabled": self.enabled,
+            "running": self.running,
+            "timings": dict(self.timings),
+            "errors": dict(self.errors) or None
+        }
+
+
+warm_up = WarmUp()
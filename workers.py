@@ -0,0 +1,499 @@
+"""
+Bounded worker pool for running blocking Docling work off the event loop
+
+Tasks do not queue in the executor in arrival order: a pool hands its
+workers out itself, to the waiting task with the best scheduling class (see
+TaskClass). Interactive work goes before bulk work, clients with fewer
+running tasks go first (fair share, optionally capped per client), and
+smaller documents go before larger ones. A task that has waited longer than
+DOCLING_SCHEDULER_MAX_WAIT seconds goes first regardless, so nothing starves.
+
+Memory is budgeted the same way: each running task reserves an estimate
+for its document (by pages), and a task starts only when its estimate fits
+in what the pool has left, so large documents wait instead of running out
+of memory together. Process-mode workers are replaced after a number of
+tasks or once their resident memory exceeds a limit, which releases memory
+Docling retains between conversions; a pool whose process died is replaced
+as well.
+"""
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional
+import multiprocessing
+import itertools
+import gc
+import asyncio
+import threading
+import logging
+import time
+import os
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration (overridable through the environment)
+WORKER_MODE = os.environ.get("DOCLING_WORKER_MODE", "thread")
+MAX_WORKERS = int(os.environ.get("DOCLING_MAX_WORKERS", os.cpu_count() or 1))
+MAX_QUEUE = int(os.environ.get("DOCLING_MAX_QUEUE", 8))
+TASK_TIMEOUT = float(os.environ.get("DOCLING_TASK_TIMEOUT", 600))
+RETRY_AFTER = int(os.environ.get("DOCLING_RETRY_AFTER", 30))
+
+# Process pool converting page shards of large PDFs in parallel (1 disables sharding)
+SHARD_WORKERS = int(os.environ.get("DOCLING_SHARD_WORKERS", min(4, os.cpu_count() or 1)))
+SHARD_QUEUE = int(os.environ.get("DOCLING_SHARD_QUEUE", 64))
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, BULK)
+
+# Running tasks per client and pool (0: no cap beyond fair-share ordering)
+CLIENT_MAX_RUNNING = int(os.environ.get("DOCLING_CLIENT_MAX_RUNNING", 0))
+SCHEDULER_MAX_WAIT = float(os.environ.get("DOCLING_SCHEDULER_MAX_WAIT", 120))
+# Size of a "page" when estimating documents without a page count (DOCX, HTML...)
+SCHEDULER_BYTES_PER_PAGE = int(os.environ.get("DOCLING_SCHEDULER_BYTES_PER_PAGE", 50_000))
+
+# Memory reserved by running tasks of the conversion pool (0 disables the
+# budget); the same per-worker budget gunicorn.conf.py sizes the workers with
+WORKER_MEMORY_MB = int(os.environ.get("DOCLING_WORKER_MEMORY_MB", 1024))
+# Estimated memory of a task: a base plus this much per page of its document
+MEMORY_BASE_MB = int(os.environ.get("DOCLING_MEMORY_BASE_MB", 50))
+MEMORY_PER_PAGE_MB = float(os.environ.get("DOCLING_MEMORY_PER_PAGE_MB", 4))
+# Models loaded by each spawned worker process (shard and process-mode workers),
+# which do not share the parent's copy
+MEMORY_MODEL_MB = int(os.environ.get("DOCLING_MEMORY_MODEL_MB", 1024))
+# Conversions are refused (503) when less memory than this would remain
+MEMORY_MIN_FREE_MB = int(os.environ.get("DOCLING_MEMORY_MIN_FREE_MB", 256))
+# Process-mode worker recycling (0 disables either limit)
+WORKER_MAX_TASKS = int(os.environ.get("DOCLING_WORKER_MAX_TASKS", 50))
+WORKER_MAX_RSS_MB = int(os.environ.get("DOCLING_WORKER_MAX_RSS_MB", 2048))
+
+MB = 1024 * 1024
+
+
+def _parse_api_keys(value: str) -> Dict[str, str]:
+    """Parse "api_key=priority,..." """
+    keys = {}
+    for entry in value.split(","):
+        key, _, priority = entry.strip().partition("=")
+        if key and priority:
+            if priority not in PRIORITIES:
+                raise ValueError(f"Unknown priority for API key: {priority}")
+            keys[key] = priority
+    return keys
+
+
+# Priority class forced for callers presenting these API keys
+API_KEY_PRIORITIES = _parse_api_keys(os.environ.get("DOCLING_API_KEY_PRIORITIES", ""))
+
+
+@dataclass(frozen=True)
+class TaskClass:
+    """
+    Scheduling class of the work done for one request
+
+    ``cost`` estimates the document size in pages (0 when unknown). ``origin``
+    records who chose the priority: an API key mapping cannot be overridden
+    by the request, and a request's choice is kept over endpoint defaults.
+    """
+    priority: str = INTERACTIVE
+    client: str = "anonymous"
+    cost: float = 0
+    origin: str = "default"
+
+
+_task_class: ContextVar[TaskClass] = ContextVar("docling_task_class", default=TaskClass())
+
+
+def current_task_class() -> TaskClass:
+    return _task_class.get()
+
+
+def classify_client(client: str, api_key: Optional[str] = None):
+    """Start the scheduling class of a request from its caller's identity"""
+    priority = API_KEY_PRIORITIES.get(api_key) if api_key else None
+    _task_class.set(TaskClass(
+        priority=priority or INTERACTIVE,
+        client=client,
+        origin="api_key" if priority else "default"
+    ))
+
+
+def set_priority(priority: str, requested: bool = True):
+    """
+    Set the priority of the current request
+
+    Args:
+        priority: INTERACTIVE or BULK
+        requested: True when the caller asked for it, False for an endpoint
+            default (which does not override a caller's choice)
+    """
+    task_class = _task_class.get()
+    if task_class.origin == "api_key" or (not requested and task_class.origin == "request"):
+        return
+    _task_class.set(replace(task_class, priority=priority, origin="request" if requested else task_class.origin))
+
+
+def set_cost(cost: float):
+    """Record the estimated size (pages) of the current request's document"""
+    _task_class.set(replace(_task_class.get(), cost=cost))
+
+
+def estimate_memory_mb(cost: float) -> float:
+    """Estimated memory needed to convert a document of ``cost`` pages"""
+    return MEMORY_BASE_MB + cost * MEMORY_PER_PAGE_MB
+
+
+def check_memory(cost: float, extra_mb: float = 0):
+    """
+    Refuse a conversion the memory left could not hold
+
+    Args:
+        cost: Estimated size of the document in pages
+        extra_mb: Memory needed besides the document, e.g. the models of
+            worker processes the conversion would spawn
+
+    Raises:
+        MemoryPressureError: If converting it would leave less than
+            DOCLING_MEMORY_MIN_FREE_MB available
+    """
+    available = metrics.available_memory_bytes()
+    if available is None or MEMORY_MIN_FREE_MB <= 0:
+        return
+    needed = estimate_memory_mb(cost) + extra_mb
+    if available / MB - needed < MEMORY_MIN_FREE_MB:
+        metrics.MEMORY_REJECTED.inc()
+        raise MemoryPressureError(
+            f"Not enough memory: {available // MB} MB available, document needs about {needed:.0f} MB"
+        )
+
+
+def _measured(fn, *args):
+    """Run a task in a worker process and report the process's memory afterwards"""
+    result = fn(*args)
+    gc.collect()
+    return result, metrics.rss_bytes()
+
+
+class _Waiter:
+    __slots__ = ("task_class", "seq", "since", "granted")
+
+    def __init__(self, task_class: TaskClass, seq: int, granted: asyncio.Future):
+        self.task_class = task_class
+        self.seq = seq
+        self.since = time.monotonic()
+        self.granted = granted
+
+
+class PoolFullError(Exception):
+    """Raised when the pool already holds as many tasks as it can queue"""
+
+
+class MemoryPressureError(Exception):
+    """Raised when there is not enough memory to take on a task"""
+
+
+class WorkerPool:
+    """
+    Executor wrapper with a bounded backlog and per-task timeouts.
+
+    At most ``max_workers`` tasks run at once and at most ``max_queue`` more
+    wait for a free worker; anything beyond that is rejected immediately with
+    ``PoolFullError`` so callers can answer with back-pressure instead of
+    piling work up in memory. A task that times out keeps its slot until the
+    worker actually finishes it, so the bound holds even for stuck documents.
+
+    ``memory_budget_mb`` caps the estimated memory of the running tasks; a
+    task larger than the whole budget runs only when the pool is otherwise
+    idle. In process mode ``max_tasks_per_child`` and ``max_rss_mb`` bound
+    how long a worker process lives.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, mode: str = "thread",
+                 name: str = "convert", client_max_running: int = CLIENT_MAX_RUNNING,
+                 memory_budget_mb: int = 0, max_tasks_per_child: int = WORKER_MAX_TASKS,
+                 max_rss_mb: int = WORKER_MAX_RSS_MB):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unsupported worker mode: {mode}")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.mode = mode
+        self.name = name
+        self.client_max_running = client_max_running
+        self.memory_budget_mb = memory_budget_mb
+        self.max_tasks_per_child = max_tasks_per_child
+        self.max_rss_mb = max_rss_mb
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        # Scheduler state, only touched on the event loop thread
+        self._running = 0
+        self._running_by_client: Dict[str, int] = {}
+        self._reserved_mb = 0.0
+        # Worker processes of the current executor (process mode)
+        self._processes = 0
+        self._waiting: List[_Waiter] = []
+        self._seq = itertools.count()
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    @property
+    def in_flight(self) -> int:
+        """Tasks accepted by the pool (running or waiting)"""
+        return self._pending
+
+    def waiting_by_priority(self) -> Dict[str, int]:
+        """Tasks waiting for a worker, per priority class"""
+        counts = dict.fromkeys(PRIORITIES, 0)
+        for waiter in self._waiting:
+            counts[waiter.task_class.priority] += 1
+        return counts
+
+    @property
+    def reserved_mb(self) -> float:
+        """Estimated memory of the running tasks"""
+        return self._reserved_mb
+
+    def spawn_memory_mb(self, tasks: int = 1) -> float:
+        """
+        Model memory of the worker processes ``tasks`` more tasks would spawn
+
+        Thread workers share the models of their process, and processes
+        already running have loaded theirs, so only new processes count.
+        """
+        if self.mode != "process":
+            return 0.0
+        processes = min(self.max_workers, self._running + tasks)
+        return max(0, processes - self._processes) * MEMORY_MODEL_MB
+
+    def _has_slot(self, task_class: TaskClass) -> bool:
+        return (
+            self._running < self.max_workers
+            and (self.client_max_running <= 0
+                 or self._running_by_client.get(task_class.client, 0) < self.client_max_running)
+        )
+
+    def _fits_memory(self, task_class: TaskClass) -> bool:
+        return (
+            self.memory_budget_mb <= 0 or self._running == 0
+            or self._reserved_mb + estimate_memory_mb(task_class.cost) <= self.memory_budget_mb
+        )
+
+    def _may_start(self, task_class: TaskClass) -> bool:
+        return self._has_slot(task_class) and self._fits_memory(task_class)
+
+    def _rank(self, waiter: _Waiter, now: float):
+        task_class = waiter.task_class
+        if now - waiter.since >= SCHEDULER_MAX_WAIT:
+            # Starvation guard: long waiters first, oldest first
+            return (0, 0, 0, 0, waiter.seq)
+        return (
+            1,
+            PRIORITIES.index(task_class.priority),
+            self._running_by_client.get(task_class.client, 0),
+            task_class.cost,
+            waiter.seq
+        )
+
+    def _start(self, task_class: TaskClass):
+        client = task_class.client
+        self._running += 1
+        self._running_by_client[client] = self._running_by_client.get(client, 0) + 1
+        self._reserved_mb += estimate_memory_mb(task_class.cost)
+
+    def _dispatch(self):
+        """Hand free workers to the best eligible waiting tasks"""
+        while self._waiting and self._running < self.max_workers:
+            # Drop waiters cancelled since they queued
+            self._waiting = [w for w in self._waiting if not w.granted.done()]
+            if not self._waiting:
+                return
+            now = time.monotonic()
+            best = min(self._waiting, key=lambda w: self._rank(w, now))
+            if (self._rank(best, now)[0] == 0 and self._has_slot(best.task_class)
+                    and not self._fits_memory(best.task_class)):
+                # A starving task only waits for memory: let the pool drain for
+                # it. One held back by its client's cap is skipped instead.
+                return
+            eligible = [w for w in self._waiting if self._may_start(w.task_class)]
+            if not eligible:
+                return
+            waiter = min(eligible, key=lambda w: self._rank(w, now))
+            self._waiting.remove(waiter)
+            self._start(waiter.task_class)
+            waiter.granted.set_result(None)
+
+    def _finish(self, task_class: TaskClass):
+        client = task_class.client
+        self._running -= 1
+        remaining = self._running_by_client.get(client, 0) - 1
+        if remaining > 0:
+            self._running_by_client[client] = remaining
+        else:
+            self._running_by_client.pop(client, None)
+        self._reserved_mb = max(0.0, self._reserved_mb - estimate_memory_mb(task_class.cost))
+        self._dispatch()
+
+    async def _acquire(self, task_class: TaskClass):
+        """Wait until the scheduler gives this task a worker"""
+        if not self._waiting and self._may_start(task_class):
+            self._start(task_class)
+            return
+        waiter = _Waiter(task_class, next(self._seq), asyncio.get_running_loop().create_future())
+        self._waiting.append(waiter)
+        self._dispatch()
+        try:
+            await waiter.granted
+        except asyncio.CancelledError:
+            if waiter in self._waiting:
+                self._waiting.remove(waiter)
+            elif waiter.granted.done() and not waiter.granted.cancelled():
+                # Granted just before the cancellation: give the worker back
+                self._finish(task_class)
+            raise
+
+    def _get_executor(self):
+        # Created lazily (and re-created after a fork) so a pool built at
+        # import time in a pre-forking server never shares threads with children
+        if self._executor is None or self._executor_pid != os.getpid():
+            if self.mode == "process":
+                # Spawned, not forked: the parent may already run model threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    max_tasks_per_child=self.max_tasks_per_child or None
+                )
+                self._processes = 0
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="docling-worker"
+                )
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def recycle(self, reason: str, executor=None):
+        """
+        Replace the worker processes
+
+        New tasks go to fresh processes; the old ones finish the tasks they
+        are running and exit.
+
+        Args:
+            reason: Why, for the log and the recycle counter
+            executor: Only recycle if this executor is still the current one
+                (tasks of an already retired executor report late)
+        """
+        with self._lock:
+            if executor is None:
+                executor = self._executor
+            if executor is None or executor is not self._executor or self._executor_pid != os.getpid():
+                return
+            self._executor = None
+        logger.warning(f"Recycling {self.name} worker processes ({reason})")
+        metrics.WORKER_RECYCLES.labels(self.name, reason).inc()
+        executor.shutdown(wait=False)
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args, timeout: Optional[float] = None):
+        """
+        Run ``fn(*args)`` in the pool and await its result
+
+        Args:
+            fn: Blocking callable (must be picklable in process mode)
+            *args: Positional arguments for ``fn``
+            timeout: Seconds to wait before giving up (defaults to TASK_TIMEOUT)
+
+        Returns:
+            Whatever ``fn`` returns
+
+        Raises:
+            PoolFullError: If the backlog is already full
+            MemoryPressureError: If a worker process died, most likely
+                killed for running out of memory
+            asyncio.TimeoutError: If the task does not finish in time
+        """
+        with self._lock:
+            if self._pending >= self.capacity:
+                raise PoolFullError(
+                    f"Worker pool is full ({self._pending}/{self.capacity} tasks)"
+                )
+            self._pending += 1
+
+        task_class = current_task_class()
+        timeout = timeout if timeout is not None else TASK_TIMEOUT
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._acquire(task_class), timeout=timeout)
+        except BaseException:
+            self._release(None)
+            raise
+        waited = time.monotonic() - started
+        metrics.SCHEDULER_WAIT.labels(self.name, task_class.priority).observe(waited)
+        metrics.record("queue_wait", waited)
+
+        loop = asyncio.get_running_loop()
+        measured = self.mode == "process" and self.max_rss_mb > 0
+        try:
+            executor = self._get_executor()
+            if self.mode == "process":
+                # Processes are spawned on demand, one per concurrent task
+                self._processes = max(self._processes, min(self._running, self.max_workers))
+            future = executor.submit(_measured, fn, *args) if measured else executor.submit(fn, *args)
+        except Exception:
+            self._release(None)
+            self._finish(task_class)
+            raise
+        future.add_done_callback(self._release)
+        # The worker is free again when the task really ends, even after a timeout
+        future.add_done_callback(
+            lambda _: loop.call_soon_threadsafe(self._finish, task_class)
+        )
+
+        wrapped = asyncio.wrap_future(future)
+        try:
+            result = await asyncio.wait_for(
+                asyncio.shield(wrapped),
+                timeout=max(0.0, timeout - waited)
+            )
+        except asyncio.CancelledError:
+            # A started task cannot be interrupted: wait for it, so the
+            # caller's inputs (e.g. the source file) outlive it
+            if not future.cancel():
+                await asyncio.gather(wrapped, return_exceptions=True)
+            raise
+        except BrokenProcessPool:
+            # A worker died (typically OOM-killed): later tasks get new processes
+            self.recycle("broken", executor)
+            raise MemoryPressureError(f"A {self.name} worker process died, likely out of memory")
+        except asyncio.TimeoutError:
+            # A running conversion cannot be interrupted and keeps its
+            # worker until done
+            future.cancel()
+            logger.warning(f"Task {getattr(fn, '__name__', fn)} timed out")
+            raise
+
+        if not measured:
+            return result
+        result, rss = result
+        if rss is not None and rss > self.max_rss_mb * MB:
+            self.recycle("memory", executor)
+        return result
+
+    def shutdown(self):
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+
+pool = WorkerPool(max_workers=MAX_WORKERS, max_queue=MAX_QUEUE, mode=WORKER_MODE,
+                  memory_budget_mb=WORKER_MEMORY_MB)
+shard_pool = WorkerPool(max_workers=SHARD_WORKERS, max_queue=SHARD_QUEUE, mode="process", name="shard")